@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 import dj_database_url
 
@@ -26,6 +27,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'donations.middleware.RequestMetricsMiddleware',  # First, so it times the whole stack
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # Add this line
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -55,6 +57,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'aidhub.wsgi.application'
+ASGI_APPLICATION = 'aidhub.asgi.application'
 
 # Database configuration
 DATABASES = {
@@ -107,9 +110,95 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # ML Models settings
-ML_MODELS_DIR = os.path.join(BASE_DIR, 'donations', 'ml', 'models')
+# Trained models; the web service and the retrain worker must share it
+ML_MODELS_DIR = os.getenv('ML_MODELS_DIR', os.path.join(BASE_DIR, 'donations', 'ml', 'models'))
 os.makedirs(ML_MODELS_DIR, exist_ok=True)
 
+# Local ResNet18 weights for the image classifier (memory-mapped at first use).
+# Fetched by `manage.py download_image_model` during the build.
+IMAGE_CLASSIFIER_WEIGHTS = os.getenv('IMAGE_CLASSIFIER_WEIGHTS', os.path.join(ML_MODELS_DIR, 'resnet18.pth'))
+# CPU inference mode: eager (fp32, mmapped weights), dynamic_int8, static_int8,
+# torchscript or compile. IMAGE_CLASSIFIER_THREADS=0 keeps torch's default.
+# `manage.py compare_image_classifier_modes` checks accuracy parity and latency.
+IMAGE_CLASSIFIER_MODE = os.getenv('IMAGE_CLASSIFIER_MODE', 'eager')
+IMAGE_CLASSIFIER_THREADS = int(os.getenv('IMAGE_CLASSIFIER_THREADS', '0'))
+IMAGE_CLASSIFIER_CHANNELS_LAST = os.getenv('IMAGE_CLASSIFIER_CHANNELS_LAST', 'False') == 'True'
+IMAGE_CLASSIFIER_TOP_K = int(os.getenv('IMAGE_CLASSIFIER_TOP_K', '3'))  # Ranked categories per response
+# 'other' wins when no category gets this much of the ImageNet probability mass
+IMAGE_CLASSIFIER_OTHER_THRESHOLD = float(os.getenv('IMAGE_CLASSIFIER_OTHER_THRESHOLD', '0.1'))
+IMAGE_CLASSIFIER_CALIBRATION_DIR = os.getenv('IMAGE_CLASSIFIER_CALIBRATION_DIR', '')  # Sample images for static_int8
+# Concurrent classify requests share one forward pass: a batch closes after
+# IMAGE_BATCH_MAX_SIZE images or IMAGE_BATCH_MAX_WAIT_MS, whichever is first.
+# Off by default: a sync gunicorn worker serves one request at a time, so
+# there is nothing to batch with. Turn it on for ASGI or threaded workers.
+IMAGE_CLASSIFIER_BATCHING = os.getenv('IMAGE_CLASSIFIER_BATCHING', 'False') == 'True'
+IMAGE_BATCH_MAX_SIZE = int(os.getenv('IMAGE_BATCH_MAX_SIZE', '16'))
+IMAGE_BATCH_MAX_WAIT_MS = float(os.getenv('IMAGE_BATCH_MAX_WAIT_MS', '10'))
+
+# Model retraining runs off the request path. Inserts mark the models dirty;
+# a fit starts once no new insert has arrived for RETRAIN_DEBOUNCE_SECONDS.
+# Jobs are drained by a separate `manage.py process_retrain_jobs --loop`
+# process (the aidhub-retrain worker in render.yaml). RETRAIN_IN_PROCESS runs
+# them in a thread inside each web worker instead, competing with requests
+# for CPU; only for single-process setups such as runserver.
+RETRAIN_DEBOUNCE_SECONDS = int(os.getenv('RETRAIN_DEBOUNCE_SECONDS', '30'))
+RETRAIN_IN_PROCESS = os.getenv('RETRAIN_IN_PROCESS', 'False') == 'True'
+# A job still 'running' this long after it was claimed lost its worker
+# (recycled or killed mid-fit) and is queued again
+RETRAIN_JOB_TIMEOUT_SECONDS = int(os.getenv('RETRAIN_JOB_TIMEOUT_SECONDS', '3600'))
+# Background retrains fold new rows into the existing urgency model. A full
+# refit happens every RETRAIN_FULL_INTERVAL_HOURS, or earlier on drift: a
+# feature mean moving more than RETRAIN_DRIFT_THRESHOLD standard deviations,
+# or error on new rows above RETRAIN_ERROR_DRIFT_FACTOR x the fit's test MAE.
+RETRAIN_FULL_INTERVAL_HOURS = float(os.getenv('RETRAIN_FULL_INTERVAL_HOURS', '24'))
+RETRAIN_DRIFT_THRESHOLD = float(os.getenv('RETRAIN_DRIFT_THRESHOLD', '0.5'))
+RETRAIN_ERROR_DRIFT_FACTOR = float(os.getenv('RETRAIN_ERROR_DRIFT_FACTOR', '1.5'))
+
+# Geocoding settings
+# GEOCODER_BACKEND is 'nominatim', 'gazetteer' (offline CSV/SQLite file) or a
+# dotted path to a class with a geocode(query) method
+GEOCODER_BACKEND = os.getenv('GEOCODER_BACKEND', 'nominatim')
+GEOCODER_GAZETTEER_PATH = os.getenv('GEOCODER_GAZETTEER_PATH', '')
+GEOCODER_USER_AGENT = os.getenv('GEOCODER_USER_AGENT', 'donation_ai')
+GEOCODER_TIMEOUT = float(os.getenv('GEOCODER_TIMEOUT', '5'))  # Seconds per upstream request
+GEOCODER_CACHE_SIZE = int(os.getenv('GEOCODER_CACHE_SIZE', '1024'))  # In-process LRU entries
+GEOCODER_NEGATIVE_TTL = int(os.getenv('GEOCODER_NEGATIVE_TTL', '86400'))  # Seconds to remember misses
+# Parallel upstream lookups in bulk imports, and per worker in the async
+# views. Keep at 1 for the public Nominatim service (1 request/second
+# policy); raise it for self-hosted servers.
+GEOCODER_CONCURRENCY = int(os.getenv('GEOCODER_CONCURRENCY', '1'))
+
+# Response cache for the read-heavy API endpoints. The file backend is shared
+# by every worker on the host, so an invalidation in one worker is seen by
+# all of them; 'locmem' is only safe with a single worker process.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+CACHES = {
+    'default': {
+        'BACKEND': {
+            'file': 'django.core.cache.backends.filebased.FileBasedCache',
+            'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+        }.get(CACHE_BACKEND, CACHE_BACKEND),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'aidhub_cache')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', '1000'))},
+    }
+}
+API_CACHE_TIMEOUT = int(os.getenv('API_CACHE_TIMEOUT', '300'))  # Seconds; writes invalidate sooner
+
+# Request metrics, served in the Prometheus text format at /metrics. Each
+# worker process keeps its own histograms. Set METRICS_TOKEN to require an
+# "Authorization: Bearer <token>" header for scraping.
+SLOW_REQUEST_THRESHOLD_MS = float(os.getenv('SLOW_REQUEST_THRESHOLD_MS', '1000'))  # 0 disables the warning
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Opt-in cProfile captures of selected views (donations.profiling): per
+# request with a signed header from `manage.py profile_token`, or sampled
+# while a ProfilingRule is enabled in the admin. Only the newest
+# PROFILE_MAX_CAPTURES files are kept.
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'aidhub_profiles'))
+PROFILE_MAX_CAPTURES = int(os.getenv('PROFILE_MAX_CAPTURES', '50'))
+PROFILE_TOKEN_MAX_AGE = int(os.getenv('PROFILE_TOKEN_MAX_AGE', '3600'))  # Seconds a token stays valid
+PROFILE_RULES_TTL = float(os.getenv('PROFILE_RULES_TTL', '10'))  # Seconds before rule changes apply
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
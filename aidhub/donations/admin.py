@@ -1,6 +1,57 @@
+import os
+from django.conf import settings
 from django.contrib import admin
-from .models import Recipient, Donation, DonatedRecipient
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
+from django.utils.html import format_html
+from .models import (
+    Recipient, Donation, DonatedRecipient, GeocodeCache, RetrainJob,
+    DonationTypeStats, DistinctDonor, DistinctLocation, StatCounter,
+    ProfilingRule, ProfileCapture,
+)
 
 admin.site.register(Recipient)
 admin.site.register(Donation)
 admin.site.register(DonatedRecipient)
+admin.site.register(GeocodeCache)
+admin.site.register(RetrainJob)
+admin.site.register(DonationTypeStats)
+admin.site.register(DistinctDonor)
+admin.site.register(DistinctLocation)
+admin.site.register(StatCounter)
+
+@admin.register(ProfilingRule)
+class ProfilingRuleAdmin(admin.ModelAdmin):
+    list_display = ('view', 'enabled', 'sample_rate', 'expires_at')
+    list_editable = ('enabled', 'sample_rate', 'expires_at')
+
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    list_display = ('created_at', 'method', 'path', 'status_code', 'duration_ms', 'trigger', 'download')
+    list_filter = ('view', 'trigger')
+    readonly_fields = [field.name for field in ProfileCapture._meta.fields] + ['download']
+
+    def has_add_permission(self, request):
+        return False  # Captures only come from profiled requests
+
+    def get_urls(self):
+        return [
+            path('<int:capture_id>/download/', self.admin_site.admin_view(self.download_view),
+                 name='donations_profilecapture_download'),
+        ] + super().get_urls()
+
+    @admin.display(description='Profile')
+    def download(self, capture):
+        url = reverse('admin:donations_profilecapture_download', args=[capture.id])
+        return format_html('<a href="{}">{}</a>', url, capture.file_name)
+
+    def download_view(self, request, capture_id):
+        capture = get_object_or_404(ProfileCapture, id=capture_id)
+        if not self.has_view_permission(request, capture):
+            raise Http404
+        try:
+            handle = open(os.path.join(settings.PROFILE_DIR, capture.file_name), 'rb')
+        except FileNotFoundError:
+            raise Http404('Profile file is gone')
+        return FileResponse(handle, as_attachment=True, filename=capture.file_name)
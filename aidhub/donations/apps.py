@@ -6,6 +6,9 @@ class DonationsConfig(AppConfig):
     name = 'donations'
 
     def ready(self):
+        from . import signals  # noqa: F401  Register signal handlers
+        from . import instrumentation  # noqa: F401  Time SQL on every new connection
+
         if os.environ.get('RUN_MAIN') and os.environ.get('DJANGO_SETTINGS_MODULE'):
             try:
                 # More reliable check for table existence
@@ -20,12 +23,10 @@ class DonationsConfig(AppConfig):
                 """)
                 table_exists = cursor.fetchone()[0]
                 if table_exists:
+                    from .ml.paths import MODEL_FILE
                     from .ml.trainer import train_model, train_trend_model
-                    from django.conf import settings
-                    from pathlib import Path
 
-                    model_path = Path(settings.BASE_DIR) / 'donations' / 'ml' / 'models' / 'donation_matcher.pkl'
-                    if not model_path.exists():
+                    if not os.path.exists(MODEL_FILE):
                         print("Initializing ML models...")
                         train_model()
                         train_trend_model()
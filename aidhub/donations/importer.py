@@ -0,0 +1,178 @@
+import csv
+import json
+import logging
+import os
+import time
+from django.db import transaction
+from .ml.predictor import predict_urgency_batch
+from .ml.scheduler import schedule_retrain
+from .models import Recipient
+from .stats import record_bulk_insert
+from .utils.geo import encode_geohash
+from .utils.geocoding import geocode_many
+from .utils.response_cache import invalidate_api_cache
+
+logger = logging.getLogger('aidhub')
+
+IMPORT_FORMATS = ('csv', 'json', 'ndjson')
+FORMAT_EXTENSIONS = {'.csv': 'csv', '.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}
+REQUIRED_FIELDS = ('name', 'location', 'donation_type', 'contact')
+MAX_REPORTED_ERRORS = 100
+
+def _iter_json_array(stream, chunk_size=65536):
+    """Objects of a top-level JSON array, decoded without reading it all."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if not started and buffer:
+            if buffer[0] != '[':
+                raise ValueError('Expected a JSON array of recipients')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer.startswith(']'):
+            return
+        if buffer:
+            try:
+                item, end = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            else:
+                yield item
+                buffer = buffer[end:]
+                continue
+        if eof:
+            if started:
+                raise ValueError('Unterminated JSON array')
+            return
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer += chunk
+
+def guess_format(filename, default='csv'):
+    return FORMAT_EXTENSIONS.get(os.path.splitext(filename or '')[1].lower(), default)
+
+def iter_records(stream, fmt):
+    """Records from a text stream: CSV with a header row, NDJSON or a JSON array.
+
+    Rows are produced as they are read, so input size does not matter. A
+    malformed NDJSON line comes through as its raw text and is rejected
+    with the other invalid rows.
+    """
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    elif fmt == 'ndjson':
+        for line in stream:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    yield line
+    elif fmt == 'json':
+        yield from _iter_json_array(stream)
+    else:
+        raise ValueError(f"Unknown import format: {fmt}")
+
+def _clean(record):
+    if not isinstance(record, dict):
+        raise ValueError('Row is not a valid JSON object')
+    values = {field: str(record.get(field) or '').strip() for field in REQUIRED_FIELDS}
+    missing = [field for field, value in values.items() if not value]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+    for field, value in values.items():
+        max_length = Recipient._meta.get_field(field).max_length
+        if len(value) > max_length:
+            raise ValueError(f"{field} is longer than {max_length} characters")
+    values['donation_type'] = values['donation_type'].lower()
+    return values
+
+def _fail(summary, row_number, error):
+    summary['failed'] += 1
+    if len(summary['errors']) < MAX_REPORTED_ERRORS:
+        summary['errors'].append({'row': row_number, 'error': error})
+
+def _import_batch(batch, summary, geocode_workers):
+    # Each distinct location is geocoded once per batch (and cached after)
+    coords = geocode_many([values['location'] for _, values in batch], max_workers=geocode_workers)
+
+    recipients = []
+    for row_number, values in batch:
+        point = coords.get(values['location'])
+        if point is None:
+            _fail(summary, row_number, f"Could not geocode location: {values['location']}")
+            continue
+        latitude, longitude = point
+        recipients.append(Recipient(
+            latitude=latitude,
+            longitude=longitude,
+            geohash=encode_geohash(latitude, longitude),  # bulk_create skips the pre_save signal
+            **values
+        ))
+    if not recipients:
+        return
+
+    for recipient, (urgency, _) in zip(recipients, predict_urgency_batch(recipients)):
+        recipient.urgency = urgency
+
+    with transaction.atomic():
+        Recipient.objects.bulk_create(recipients)
+        # bulk_create sends no signals, so update the aggregates and cache here
+        record_bulk_insert(Recipient, recipients)
+        transaction.on_commit(invalidate_api_cache)
+    summary['imported'] += len(recipients)
+
+def iter_import(stream, fmt, batch_size=500, geocode_workers=None):
+    """Stream recipients from ``stream`` into the database.
+
+    Rows are validated, geocoded (deduplicated, at most ``geocode_workers``
+    upstream lookups at a time), scored with one urgency prediction per
+    batch and written with ``bulk_create``, ``batch_size`` rows per
+    transaction. Invalid rows are skipped and reported. Yields a copy of
+    the running summary after each batch; the last one is final. One
+    retrain is scheduled at the end if anything was imported, even if the
+    import stops early.
+    """
+    started = time.perf_counter()
+    summary = {'rows': 0, 'imported': 0, 'failed': 0, 'errors': []}
+
+    def snapshot():
+        elapsed = time.perf_counter() - started
+        summary['seconds'] = round(elapsed, 3)
+        summary['rows_per_second'] = round(summary['rows'] / elapsed, 1) if elapsed else 0.0
+        return {**summary, 'errors': list(summary['errors'])}
+
+    batch = []
+    try:
+        for row_number, record in enumerate(iter_records(stream, fmt), start=1):
+            summary['rows'] += 1
+            try:
+                batch.append((row_number, _clean(record)))
+            except ValueError as e:
+                _fail(summary, row_number, str(e))
+            if len(batch) >= batch_size:
+                _import_batch(batch, summary, geocode_workers)
+                batch = []
+                yield snapshot()
+        if batch:
+            _import_batch(batch, summary, geocode_workers)
+    finally:
+        if summary['imported']:
+            schedule_retrain()
+
+    final = snapshot()
+    logger.info(f"Imported {final['imported']} of {final['rows']} recipients "
+                f"in {final['seconds']}s ({final['failed']} failed)")
+    yield final
+
+def import_recipients(stream, fmt, batch_size=500, geocode_workers=None, progress=None):
+    """Run ``iter_import`` to the end; ``progress`` gets each summary. Returns the final one."""
+    summary = None
+    for summary in iter_import(stream, fmt, batch_size=batch_size, geocode_workers=geocode_workers):
+        if progress:
+            progress(summary)
+    return summary
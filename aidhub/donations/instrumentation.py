@@ -0,0 +1,182 @@
+import bisect
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+PHASES = ('sql', 'geocode', 'ml_inference', 'ml_training')
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+class Histogram:
+    """In-process histogram rendered in the Prometheus text format.
+
+    One series per combination of ``labelnames`` values. Counts are per
+    process: with several workers, each one reports its own.
+    """
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [count per bucket (+Inf last), sum]
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, list(counts), total) for key, (counts, total) in self._series.items())
+        for key, counts, total in series:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+REQUEST_SECONDS = Histogram(
+    'aidhub_request_duration_seconds', 'Wall time per request', ('view', 'method', 'status'),
+)
+REQUEST_QUERIES = Histogram(
+    'aidhub_request_queries', 'SQL queries per request', ('view',), buckets=QUERY_BUCKETS,
+)
+REQUEST_PHASE_SECONDS = Histogram(
+    'aidhub_request_phase_seconds',
+    'Time per request spent in SQL, geocoding and ML inference or training (phases may overlap)',
+    ('view', 'phase'),
+)
+OPERATION_SECONDS = Histogram(
+    'aidhub_operation_duration_seconds',
+    'Duration of each geocoding and ML call, inside requests or not', ('operation',),
+)
+HISTOGRAMS = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_PHASE_SECONDS, OPERATION_SECONDS)
+
+class RequestTimings:
+    """What one request spent its time on so far."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.phases = defaultdict(float)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+_current = ContextVar('aidhub_request_timings', default=None)
+_active_phases = ContextVar('aidhub_active_phases', default=frozenset())
+
+def start_request():
+    """Begin collecting timings for the current request (or task)."""
+    timings = RequestTimings()
+    return _current.set(timings), timings
+
+def end_request(token):
+    _current.reset(token)
+
+@contextmanager
+def timed(phase):
+    """Time a geocoding or ML call; usable as a decorator on sync functions.
+
+    The time is added to the current request's ``phase`` total, if there
+    is a request, and always to the per-operation histogram. Calls nested
+    in one of the same phase are part of the outer one and not counted.
+    """
+    active = _active_phases.get()
+    if phase in active:
+        yield
+        return
+    token = _active_phases.set(active | {phase})
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        _active_phases.reset(token)
+        OPERATION_SECONDS.observe(elapsed, operation=phase)
+        timings = _current.get()
+        if timings is not None:
+            timings.phases[phase] += elapsed
+
+def _time_query(execute, sql, params, many, context):
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.queries += 1
+        timings.phases['sql'] += time.perf_counter() - started
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Installed on every connection rather than with execute_wrapper() in
+    # the middleware: async views run their queries on executor threads,
+    # each with its own connection
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+def record_request(timings, view, method, status):
+    REQUEST_SECONDS.observe(timings.elapsed(), view=view, method=method, status=status)
+    REQUEST_QUERIES.observe(timings.queries, view=view)
+    REQUEST_PHASE_SECONDS.observe(timings.phases['sql'], view=view, phase='sql')
+    for phase in PHASES[1:]:
+        if phase in timings.phases:
+            REQUEST_PHASE_SECONDS.observe(timings.phases[phase], view=view, phase=phase)
+
+def _batcher_lines():
+    # Only report the image batcher if this process already created it;
+    # importing the classifier here would load torch
+    classifier_module = sys.modules.get('donations.ml.image_classifier')
+    stats = classifier_module.batcher_stats() if classifier_module else None
+    if stats is None:
+        return []
+    lines = [
+        '# HELP aidhub_image_batcher_queue_depth Images waiting for a batch',
+        '# TYPE aidhub_image_batcher_queue_depth gauge',
+        f"aidhub_image_batcher_queue_depth {stats['queue_depth']}",
+        '# HELP aidhub_image_batcher_items_total Images classified through the batcher',
+        '# TYPE aidhub_image_batcher_items_total counter',
+        f"aidhub_image_batcher_items_total {stats['items']}",
+        '# HELP aidhub_image_batcher_batches_total Batched forward passes, by batch size',
+        '# TYPE aidhub_image_batcher_batches_total counter',
+    ]
+    lines += [
+        f"aidhub_image_batcher_batches_total{_format_labels([('size', size)])} {count}"
+        for size, count in stats['batch_sizes'].items()
+    ]
+    return lines
+
+def render_metrics():
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render()
+    lines += _batcher_lines()
+    return '\n'.join(lines) + '\n'
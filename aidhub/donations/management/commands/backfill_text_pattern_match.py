@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from donations.models import Donation
+from donations.utils.text_matcher import match_donation_texts
+
+class Command(BaseCommand):
+    help = 'Fill Donation.text_pattern_match for historical rows using the bulk text matcher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--all', action='store_true',
+                            help='Recompute rows that already have a value')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        donations = Donation.objects.only('id', 'donation_type', 'suggested_type', 'classified_type')
+        if not options['all']:
+            donations = donations.filter(text_pattern_match='')
+
+        # Keyset pagination on id, so updates never disturb an open cursor
+        updated = 0
+        last_id = 0
+        while True:
+            batch = list(donations.filter(id__gt=last_id).order_by('id')[:batch_size])
+            if not batch:
+                break
+            updated += self.update_batch(batch)
+            last_id = batch[-1].id
+
+        self.stdout.write(self.style.SUCCESS(f'Updated text_pattern_match on {updated} donations'))
+
+    def update_batch(self, donations):
+        # Donations keep no free-text description, so match the type fields
+        texts = [
+            ' '.join(filter(None, [d.donation_type, d.suggested_type, d.classified_type]))
+            for d in donations
+        ]
+        changed = []
+        for donation, matches in zip(donations, match_donation_texts(texts)):
+            if matches:
+                donation.text_pattern_match = ','.join(matches)[:100]
+                changed.append(donation)
+        with transaction.atomic():
+            Donation.objects.bulk_update(changed, ['text_pattern_match'])
+        return len(changed)
@@ -0,0 +1,67 @@
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from donations.ml.batching import MicroBatcher
+from donations.ml.image_classifier import get_classifier
+
+def make_images(count, size=320, seed=0):
+    """Random JPEG uploads, so the benchmark needs no sample data."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        buf = io.BytesIO()
+        Image.fromarray(pixels).save(buf, 'JPEG')
+        images.append(buf.getvalue())
+    return images
+
+class Command(BaseCommand):
+    help = 'Measure image classification throughput (images/sec) with and without micro-batching'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8, 32],
+                            help='Numbers of concurrent clients to test')
+        parser.add_argument('--images', type=int, default=64,
+                            help='Images classified per run')
+        parser.add_argument('--max-batch', type=int, default=settings.IMAGE_BATCH_MAX_SIZE)
+        parser.add_argument('--max-wait-ms', type=float, default=settings.IMAGE_BATCH_MAX_WAIT_MS)
+
+    def handle(self, *args, **options):
+        classifier = get_classifier()
+        if classifier.model is None:
+            raise CommandError('Image classification model could not be loaded')
+
+        images = make_images(options['images'])
+        classifier.classify_image(images[0])  # Warm up
+
+        def unbatched(image):
+            return classifier.classify_image(image)
+
+        batcher = MicroBatcher(classifier.classify_batch,
+                               max_batch_size=options['max_batch'],
+                               max_wait_ms=options['max_wait_ms'])
+
+        def batched(image):
+            return batcher.predict(classifier.preprocess_image(image))
+
+        self.stdout.write(f"{'concurrency':>11} {'mode':>9} {'images/s':>9} {'mean batch':>10}")
+        for concurrency in options['concurrency']:
+            for mode, fn in (('unbatched', unbatched), ('batched', batched)):
+                before = batcher.stats()
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    list(pool.map(fn, images))
+                elapsed = time.perf_counter() - start
+
+                after = batcher.stats()
+                batches = after['batches'] - before['batches']
+                mean_batch = (after['items'] - before['items']) / batches if batches else 1.0
+                self.stdout.write(
+                    f"{concurrency:>11} {mode:>9} {len(images) / elapsed:>9.1f} {mean_batch:>10.1f}"
+                )
+
+        self.stdout.write(f"Batch size histogram: {batcher.stats()['batch_sizes']}")
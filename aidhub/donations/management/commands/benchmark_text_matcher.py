@@ -0,0 +1,56 @@
+import random
+import re
+import time
+from django.core.management.base import BaseCommand
+from donations.utils.text_matcher import (
+    DONATION_KEYWORDS, DONATION_PATTERNS, match_donation_text, scan_donation_text,
+)
+
+FILLER_WORDS = (
+    'the a of and to in for with from our family community please need some '
+    'old used new spare extra winter summer kids adults gently brand items'
+).split()
+
+def legacy_match(text):
+    """The previous implementation: one unanchored re.search per category."""
+    text = text.lower()
+    return [category for category, pattern in DONATION_PATTERNS.items() if re.search(pattern, text)]
+
+def make_text(words, keyword_rate, rng):
+    """Filler text mentioning one or two donation categories."""
+    categories = rng.sample(list(DONATION_KEYWORDS), rng.choice([1, 2]))
+    keywords = [stem for category in categories for stem in DONATION_KEYWORDS[category]]
+    return ' '.join(
+        rng.choice(keywords) + rng.choice(['', 's', 'es', 'ing'])
+        if rng.random() < keyword_rate else rng.choice(FILLER_WORDS)
+        for _ in range(words)
+    )
+
+class Command(BaseCommand):
+    help = 'Benchmark donation text matching on long free-text descriptions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--words', type=int, nargs='+', default=[20, 200, 2000, 20000],
+                            help='Description lengths (in words) to test')
+        parser.add_argument('--keyword-rate', type=float, default=0.01,
+                            help='Fraction of words that are donation keywords')
+        parser.add_argument('--texts', type=int, default=200,
+                            help='Texts per length')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.stdout.write(f"{'words':>6} {'legacy us':>10} {'match us':>9} {'scan us':>8} {'speedup':>8}")
+        for words in options['words']:
+            texts = [make_text(words, options['keyword_rate'], rng) for _ in range(options['texts'])]
+            timings = {}
+            for name, fn in (('legacy', legacy_match), ('match', match_donation_text),
+                             ('scan', scan_donation_text)):
+                start = time.perf_counter()
+                for text in texts:
+                    fn(text)
+                timings[name] = (time.perf_counter() - start) / len(texts) * 1e6
+            self.stdout.write(
+                f"{words:>6} {timings['legacy']:>10.1f} {timings['match']:>9.1f} "
+                f"{timings['scan']:>8.1f} {timings['legacy'] / timings['match']:>7.1f}x"
+            )
@@ -0,0 +1,138 @@
+import gc
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from donations.ml.trainer import get_combined_dataset, get_daily_counts
+from donations.models import DonatedRecipient, Donation, Recipient
+from donations.synthetic import seed_synthetic
+
+def legacy_combined_dataset():
+    """The previous get_combined_dataset: ORM dicts into DataFrames, then concat."""
+    current_data = pd.DataFrame(
+        Recipient.objects.filter(status='open').values(
+            'id', 'name', 'location', 'latitude', 'longitude',
+            'donation_type', 'urgency', 'date_added'
+        )
+    )
+    historical_data = pd.DataFrame(
+        DonatedRecipient.objects.values(
+            'id', 'name', 'location', 'latitude', 'longitude',
+            'donation_type', 'urgency', 'transaction_date'
+        )
+    ).rename(columns={'transaction_date': 'date_added'})
+    df = pd.concat([current_data, historical_data], ignore_index=True)
+
+    X = pd.DataFrame()
+    X['latitude'] = df['latitude']
+    X['longitude'] = df['longitude']
+    donation_types = pd.Categorical(df['donation_type'])
+    X['donation_type_code'] = donation_types.codes
+    donation_dummies = pd.get_dummies(donation_types, prefix='type')
+    donation_dummies.index = df.index
+    X = pd.concat([X, donation_dummies], axis=1)
+    df['date_added'] = pd.to_datetime(df['date_added'])
+    X['day_of_week'] = df['date_added'].dt.dayofweek
+    X['day_of_month'] = df['date_added'].dt.day
+    X['month'] = df['date_added'].dt.month
+    return df, X, df['urgency'], donation_types.categories.tolist()
+
+def legacy_daily_counts():
+    """The previous train_trend_model input: rows per type and day via groupby."""
+    recipients = pd.DataFrame(
+        Recipient.objects.filter(status='open').values('donation_type', 'date_added')
+    )
+    donated = pd.DataFrame(
+        DonatedRecipient.objects.values('donation_type', 'transaction_date')
+    ).rename(columns={'transaction_date': 'date_added'})
+    donations = pd.DataFrame(
+        Donation.objects.values('donation_type', 'donation_date')
+    ).rename(columns={'donation_date': 'date_added'})
+    all_data = pd.concat([recipients, donated, donations], ignore_index=True)
+    all_data['date_added'] = pd.to_datetime(all_data['date_added'])
+    all_data['date'] = all_data['date_added'].dt.date
+    return all_data.groupby(['donation_type', 'date']).size().reset_index(name='count')
+
+def measure(fn):
+    """Seconds for one call, then the traced peak in bytes of a second one.
+
+    Timing runs untraced, as tracemalloc slows every allocation down.
+    """
+    gc.collect()
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+class Command(BaseCommand):
+    help = ('Compare time and peak memory (tracemalloc) of the columnar training-data '
+            'extraction against the previous DataFrame path, on a test database '
+            'seeded with --rows training rows, and check both give the same features.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000,
+                            help='Training rows (open plus claimed recipients) to seed')
+        parser.add_argument('--donations', type=int,
+                            help='Donations to seed (claimed recipients); default half of --rows')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            started = time.perf_counter()
+            counts = seed_synthetic(recipients=options['rows'], donations=options['donations'],
+                                    seed=options['seed'])
+            self.stderr.write(f"Seeded {counts} in {time.perf_counter() - started:.0f}s")
+            self.compare('get_combined_dataset', legacy_combined_dataset, get_combined_dataset,
+                         self.check_dataset)
+            self.compare('daily type counts', legacy_daily_counts, get_daily_counts,
+                         self.check_daily_counts)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def compare(self, name, legacy, columnar, check):
+        legacy_result, legacy_seconds, legacy_peak = measure(legacy)
+        result, seconds, peak = measure(columnar)
+        check(legacy_result, result)
+        self.stdout.write(f"{name}:")
+        self.stdout.write(f"  {'':<10} {'seconds':>8} {'peak MB':>8}")
+        self.stdout.write(f"  {'legacy':<10} {legacy_seconds:>8.2f} {legacy_peak / 2 ** 20:>8.1f}")
+        self.stdout.write(f"  {'columnar':<10} {seconds:>8.2f} {peak / 2 ** 20:>8.1f}")
+        self.stdout.write(f"  {legacy_seconds / seconds:.1f}x faster, "
+                          f"{legacy_peak / peak:.1f}x less peak memory; same result")
+
+    def check_dataset(self, legacy, columnar):
+        _, legacy_X, legacy_y, legacy_categories = legacy
+        rows, X, y, categories = columnar
+        if categories != legacy_categories or list(X.columns) != list(legacy_X.columns):
+            raise CommandError(f"Feature layout differs: {list(X.columns)} vs {list(legacy_X.columns)}")
+        for column in X.columns:
+            # Coordinates are float32 now; everything else must match exactly
+            tolerance = 1e-4 if column in ('latitude', 'longitude') else 0
+            if not np.allclose(X[column].to_numpy(np.float64), legacy_X[column].to_numpy(np.float64),
+                               rtol=0, atol=tolerance):
+                raise CommandError(f"Column {column} differs from the previous extraction")
+        if not np.array_equal(y, legacy_y.to_numpy()):
+            raise CommandError("Urgency targets differ from the previous extraction")
+        if len(rows) != len(legacy_X):
+            raise CommandError(f"{len(rows)} rows vs {len(legacy_X)}")
+
+    def check_daily_counts(self, legacy, columnar):
+        categories, codes, days, counts = columnar
+        result = pd.DataFrame({
+            'donation_type': np.array(categories, dtype=object)[codes],
+            'date': days.astype('datetime64[D]').astype(object),
+            'count': counts,
+        }).sort_values(['donation_type', 'date'], ignore_index=True)
+        if not result.equals(legacy.sort_values(['donation_type', 'date'], ignore_index=True)):
+            raise CommandError("Daily counts differ from the previous groupby")
@@ -0,0 +1,127 @@
+import re
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from donations.ml.predictor import urgency_average_queries
+from donations.ml.scheduler import pending_jobs, stale_jobs
+from donations.ml.trainer import training_rows
+from donations.models import Donation, DonatedRecipient, Recipient
+from donations.stats import grouped_counts, type_stats_rows, type_totals
+from donations.utils.geo import geohash_prefixes
+from donations.utils.geocoding import cache_entries
+from donations.views import donation_by_key, history_rows, recipient_candidates
+
+# One table access in a plan: "SEARCH t USING INDEX i (a=? AND b>?)",
+# "SEARCH t USING INTEGER PRIMARY KEY (rowid=?)", or a bare "SCAN t"
+# (older SQLite says "SCAN TABLE t"), which reads every row
+TABLE_ACCESS = re.compile(
+    r'^(?:SCAN|SEARCH) (?:TABLE )?(?P<table>\w+)(?: AS \w+)?'
+    r'(?: USING (?:(?:COVERING )?INDEX (?P<index>\w+)|(?P<pk>(?:INTEGER )?PRIMARY KEY)))?'
+    r'(?: \((?P<constraints>.*)\))?$'
+)
+PRIMARY_KEY = 'PRIMARY KEY'
+# For tables small enough that reading them whole is the right plan
+WHOLE_TABLE = 'whole table'
+
+# Columns that on their own narrow a search too little to count as using an
+# index: nearly every recipient is open
+LOW_SELECTIVITY = {
+    'donations_recipient': {'status'},
+}
+
+def hot_queries():
+    """The queries the request paths and retrain jobs run, by name, each
+    with the index (or indexes, for joins) it should be served from.
+
+    Built by the same functions the views, stats and ML code call, so a
+    change there is checked here too.
+    """
+    now = timezone.now()
+    current_avgs, historical_avgs = urgency_average_queries(['food', 'books'])
+    new_recipients, new_donated, _ = training_rows(since={'recipient': 100, 'donated': 100})
+    return {
+        'recipient list by type': (recipient_candidates('food'), 'recipient_open_type_geo_idx'),
+        'recipient list by type and geohash': (
+            recipient_candidates('food', geohash_prefixes(14.6, 121.0, 10)), 'recipient_open_type_geo_idx'),
+        'avg urgency per type (open)': (current_avgs, 'recipient_open_type_geo_idx'),
+        'avg urgency per type (donated)': (historical_avgs, 'donated_type_urgency_idx'),
+        'type stats (donated, full rebuild)': (
+            type_totals(DonatedRecipient.objects.all()), 'donated_type_urgency_idx'),
+        'history first page': (history_rows()[:51], 'donated_txn_date_id_idx'),
+        'history next page': (history_rows((now, 100))[:51], 'donated_txn_date_id_idx'),
+        'donors (donations)': (grouped_counts(Donation.objects.all(), 'donor_name'), 'donation_donor_name_idx'),
+        'donors (donated)': (
+            grouped_counts(DonatedRecipient.objects.all(), 'donor_name'), 'donated_donor_name_idx'),
+        'donation by idempotency key': (
+            donation_by_key('abc'), ('sqlite_autoindex_donations_donation_1', PRIMARY_KEY)),
+        'new recipients since last fit': (new_recipients, PRIMARY_KEY),
+        'new donated rows since last fit': (new_donated, PRIMARY_KEY),
+        # A row per source and donation type
+        'trending (aggregate table)': (type_stats_rows('recipient', limit=3), WHOLE_TABLE),
+        'geocode cache lookup': (cache_entries(['manila']), 'sqlite_autoindex_donations_geocodecache_1'),
+        'pending retrain jobs': (pending_jobs(), 'donations_retrainjob_status_488fbcb5'),
+        'stale retrain jobs': (stale_jobs(), 'donations_retrainjob_status_488fbcb5'),
+    }
+
+def plan_problems(plan, expected):
+    """Why ``plan`` (EXPLAIN QUERY PLAN details) is not served from the
+    ``expected`` indexes; empty when it is."""
+    problems = []
+    used = set()
+    for detail in plan:
+        access = TABLE_ACCESS.match(detail)
+        if access is None:
+            continue  # MULTI-INDEX OR, temp B-trees and the like
+        table = access.group('table')
+        index = access.group('index') or (PRIMARY_KEY if access.group('pk') else WHOLE_TABLE)
+        used.add(index)
+        if index == WHOLE_TABLE and index not in expected:
+            problems.append(f"full scan of {table}")
+        elif index not in expected:
+            problems.append(f"{table} via {index}, expected {' or '.join(expected)}")
+        elif detail.startswith('SEARCH') and access.group('constraints'):
+            columns = {re.match(r'\w+', c).group() for c in access.group('constraints').split(' AND ')}
+            if columns <= LOW_SELECTIVITY.get(table, set()):
+                problems.append(f"{table} searched on {', '.join(sorted(columns))} only")
+    problems.extend(f"{index} not used" for index in expected if index not in used)
+    return problems
+
+class Command(BaseCommand):
+    help = ('Run EXPLAIN QUERY PLAN (SQLite) for every hot query and fail if one '
+            'is not served from the index it names, reads a whole table, or '
+            'searches on a low-selectivity column only. Needs representative '
+            'data, e.g. from seed_synthetic.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--show-plans', action='store_true', help='Print every query plan')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('check_query_plans needs SQLite; run it with DATABASE_URL=sqlite:///...')
+        if not Recipient.objects.exists():
+            raise CommandError('No recipients to plan against; seed some first (manage.py seed_synthetic)')
+
+        failures = []
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Plan with statistics of the data, as Postgres does in production.
+            # Rolled back, so the database is left as it was
+            cursor.execute('ANALYZE')
+            for name, (queryset, expected) in hot_queries().items():
+                expected = (expected,) if isinstance(expected, str) else expected
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+                plan = [row[-1] for row in cursor.fetchall()]
+                problems = plan_problems(plan, expected)
+
+                status = self.style.ERROR('WRONG PLAN') if problems else self.style.SUCCESS('ok')
+                self.stdout.write(f"{name:<40} {status}")
+                if options['show_plans'] or problems:
+                    for detail in plan:
+                        self.stdout.write(f"    {detail}")
+                if problems:
+                    failures.append(f"{name} ({'; '.join(problems)})")
+            transaction.set_rollback(True)
+
+        if failures:
+            raise CommandError(f"Hot queries off their index: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('All hot queries use their index'))
@@ -0,0 +1,112 @@
+import asyncio
+import time
+import uuid
+from urllib.parse import urlencode
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.core.handlers.asgi import ASGIHandler
+from django.test import Client
+from donations.models import GeocodeCache
+from donations.utils.geocoding import Geocoder, get_geocoder, set_geocoder
+
+class SlowGeocoder:
+    """Stands in for Nominatim: every lookup takes ``latency`` seconds."""
+    name = 'benchmark-stub'
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def geocode(self, query):
+        time.sleep(self.latency)
+        return 14.5995, 120.9842
+
+class Command(BaseCommand):
+    help = ('Compare /api/recipients throughput for one sync worker (the gunicorn sync '
+            'config) against one ASGI event loop, with a slow stub geocoder')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=40)
+        parser.add_argument('--concurrency', type=int, default=40,
+                            help='In-flight requests on the event loop')
+        parser.add_argument('--geocode-latency-ms', type=float, default=200)
+        parser.add_argument('--geocode-concurrency', type=int, default=16,
+                            help='Upstream lookups allowed at once (GEOCODER_CONCURRENCY)')
+        parser.add_argument('--type', default='food', help='Donation type to search for')
+
+    def handle(self, *args, **options):
+        tag = f"benchmark-{uuid.uuid4().hex[:8]}"
+        original = get_geocoder()
+        set_geocoder(Geocoder(backend=SlowGeocoder(options['geocode_latency_ms'] / 1000),
+                              max_concurrency=options['geocode_concurrency']))
+        try:
+            # Distinct addresses so every request pays for a geocode
+            sync_results = self.run_sync(tag, options)
+            async_results = asyncio.run(self.run_async(tag, options))
+        finally:
+            set_geocoder(original)
+            GeocodeCache.objects.filter(backend=SlowGeocoder.name).delete()
+
+        self.stdout.write(f"{'mode':>22} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7} {'errors':>6}")
+        for mode, (wall, latencies, errors) in (('sync worker (WSGI)', sync_results),
+                                                ('event loop (ASGI)', async_results)):
+            latencies = np.array(latencies) * 1000
+            self.stdout.write(
+                f"{mode:>22} {options['requests'] / wall:>7.1f} {np.percentile(latencies, 50):>7.0f} "
+                f"{np.percentile(latencies, 95):>7.0f} {errors:>6}"
+            )
+        self.stdout.write(f"Speedup: {sync_results[0] / async_results[0]:.1f}x")
+
+    def params(self, tag, mode, i, options):
+        return {'type': options['type'], 'location': f"{tag} {mode} {i}"}
+
+    def run_sync(self, tag, options):
+        # A sync worker with one thread serves one request at a time
+        client = Client()
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for i in range(options['requests']):
+            t0 = time.perf_counter()
+            response = client.get('/api/recipients', self.params(tag, 'sync', i, options))
+            latencies.append(time.perf_counter() - t0)
+            errors += response.status_code >= 500
+        return time.perf_counter() - start, latencies, errors
+
+    async def run_async(self, tag, options):
+        # Driven through ASGIHandler like uvicorn does (the test AsyncClient
+        # shares one thread for sync middleware across all requests)
+        app = ASGIHandler()
+        limit = asyncio.Semaphore(options['concurrency'])
+        latencies, errors = [], 0
+
+        async def one(i):
+            nonlocal errors
+            received = False
+            messages = []
+
+            async def receive():
+                nonlocal received
+                if received:
+                    await asyncio.Future()  # The client never disconnects
+                received = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': '/api/recipients',
+                'raw_path': b'/api/recipients', 'root_path': '',
+                'query_string': urlencode(self.params(tag, 'async', i, options)).encode(),
+                'headers': [(b'host', b'testserver')],
+                'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+            }
+            async with limit:
+                t0 = time.perf_counter()
+                await app(scope, receive, send)
+                latencies.append(time.perf_counter() - t0)
+                errors += messages[0]['status'] >= 500
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(options['requests'])))
+        return time.perf_counter() - start, latencies, errors
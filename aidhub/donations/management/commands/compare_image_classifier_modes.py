@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+from donations.ml.image_classifier import (
+    INFERENCE_MODES, DonationImageClassifier, build_transform, load_image_folder,
+)
+
+def synthetic_images(count, seed=0):
+    rng = np.random.default_rng(seed)
+    transform = build_transform()
+    tensors = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, (320, 320, 3), dtype=np.uint8)
+        tensors.append(transform(Image.fromarray(pixels)).unsqueeze(0))
+    return tensors
+
+class Command(BaseCommand):
+    help = ('Check accuracy parity of each image classifier inference mode against '
+            'fp32 eager on --sample-dir images and report p50/p99 latency and peak RSS')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sample-dir', default='',
+                            help='Folder of sample images; without it random images are used, '
+                                 'which times the modes but checks no parity')
+        parser.add_argument('--calibration-dir', default='',
+                            help='Folder of images for static_int8 calibration; keep it '
+                                 'apart from --sample-dir (default IMAGE_CLASSIFIER_CALIBRATION_DIR)')
+        parser.add_argument('--modes', nargs='+', default=list(INFERENCE_MODES),
+                            choices=INFERENCE_MODES)
+        parser.add_argument('--images', type=int, default=32,
+                            help='Maximum number of sample images to use')
+        parser.add_argument('--runs', type=int, default=3,
+                            help='Timed passes over the sample set per mode')
+        parser.add_argument('--threads', type=int, default=0,
+                            help='torch.set_num_threads value (0 keeps the default)')
+        parser.add_argument('--channels-last', action='store_true')
+        parser.add_argument('--min-agreement', type=float, default=0.95,
+                            help='Fail if a mode agrees with fp32 on fewer top-1 '
+                                 'donation categories than this')
+        # Internal: measure a single mode in a fresh process
+        parser.add_argument('--worker-mode', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker_mode']:
+            self.stdout.write(json.dumps(self.measure(options['worker_mode'], options)))
+            return
+
+        results = {}
+        modes = ['eager'] + [m for m in options['modes'] if m != 'eager']
+        for mode in modes:
+            # Each mode runs in its own process so peak RSS is per mode
+            cmd = [sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'compare_image_classifier_modes',
+                   '--worker-mode', mode, '--images', str(options['images']),
+                   '--runs', str(options['runs']), '--threads', str(options['threads'])]
+            if options['sample_dir']:
+                cmd += ['--sample-dir', options['sample_dir']]
+            if options['calibration_dir']:
+                cmd += ['--calibration-dir', options['calibration_dir']]
+            if options['channels_last']:
+                cmd += ['--channels-last']
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                self.stderr.write(f"{mode}: failed\n{proc.stderr.strip()}")
+                continue
+            results[mode] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+        if 'eager' not in results:
+            raise CommandError('The fp32 eager reference run failed')
+        reference = results['eager']
+
+        self.stdout.write(f"{'mode':>13} {'top1 agree':>10} {'category agree':>14} "
+                          f"{'max |dp|':>8} {'p50 ms':>7} {'p99 ms':>7} {'peak RSS MB':>11}")
+        failed = []
+        for mode, r in results.items():
+            top1 = np.mean(np.array(r['top1']) == np.array(reference['top1']))
+            category = np.mean(np.array(r['categories']) == np.array(reference['categories']))
+            prob_diff = np.max(np.abs(np.array(r['confidences']) - np.array(reference['confidences'])))
+            self.stdout.write(f"{mode:>13} {top1:>10.1%} {category:>14.1%} {prob_diff:>8.4f} "
+                              f"{r['p50_ms']:>7.1f} {r['p99_ms']:>7.1f} {r['peak_rss_mb']:>11.0f}")
+            if category < options['min_agreement']:
+                failed.append(mode)
+
+        if not options['sample_dir']:
+            self.stdout.write('Random images: agreement is not meaningful, rerun with --sample-dir')
+            return
+        if failed:
+            raise CommandError(f"Accuracy parity below {options['min_agreement']:.0%} for: {', '.join(failed)}")
+
+    def measure(self, mode, options):
+        import torch
+
+        classifier = DonationImageClassifier(mode=mode, threads=options['threads'],
+                                             channels_last=options['channels_last'],
+                                             calibration_dir=options['calibration_dir'] or None)
+        if classifier.model is None or classifier.mode != mode:
+            raise CommandError(f'Could not build the {mode} model')
+
+        if options['sample_dir']:
+            if not os.path.isdir(options['sample_dir']):
+                raise CommandError(f"No such folder: {options['sample_dir']}")
+            images = load_image_folder(options['sample_dir'], classifier.transform, limit=options['images'])
+        else:
+            images = synthetic_images(options['images'])
+
+        # Warm up (and compile, for torch.compile)
+        classifier.classify_batch(images[:1])
+
+        latencies = []
+        for _ in range(options['runs']):
+            for image in images:
+                start = time.perf_counter()
+                classifier.classify_batch([image])
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        top1 = []
+        with torch.inference_mode():
+            for image in images:
+                if classifier.channels_last:
+                    image = image.contiguous(memory_format=torch.channels_last)
+                top1.append(int(classifier.model(image).argmax(dim=1)))
+        predictions = classifier.classify_batch(images)
+
+        return {
+            'top1': top1,
+            'categories': [category for category, _ in predictions],
+            'confidences': [confidence for _, confidence in predictions],
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        }
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from donations.ml.image_classifier import download_weights, get_weights_path
+
+class Command(BaseCommand):
+    help = 'Download the ResNet18 weights used by the image classifier to a local file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true',
+                            help='Download again even if the weights file exists')
+
+    def handle(self, *args, **options):
+        import os
+
+        path = get_weights_path()
+        if os.path.exists(path) and not options['force']:
+            self.stdout.write(f'Weights already present at {path}')
+            return
+
+        self.stdout.write('Downloading ResNet18 weights...')
+        download_weights(path)
+        self.stdout.write(self.style.SUCCESS(f'Saved weights to {path}'))
@@ -0,0 +1,134 @@
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from donations.models import Recipient, Donation, DonatedRecipient
+from donations.stats import get_summary, get_type_stats, rebuild_stats
+
+def stats_snapshot():
+    # Urgency sums are accumulated in a different order than a rebuild adds
+    # them up, so compare averages at a precision float error can't reach
+    types = [
+        {**stat, 'avg_urgency': round(stat['avg_urgency'], 6)}
+        for source in ('recipient', 'donated') for stat in get_type_stats(source)
+    ]
+    return get_summary(), types
+
+class Command(BaseCommand):
+    help = ('Race parallel donors for a few recipients through /api/donate and check '
+            'that no recipient is claimed twice and no accepted donation is lost')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--donors', type=int, default=50, help='Parallel donor threads')
+        parser.add_argument('--recipients', type=int, default=10, help='Recipients the donors compete for')
+        parser.add_argument('--retry-rate', type=float, default=0.3,
+                            help='Fraction of donors that resend their POST with the same idempotency key')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated rows')
+
+    def handle(self, *args, **options):
+        tag = f"loadtest-{uuid.uuid4().hex[:8]}"
+        recipients = [
+            Recipient.objects.create(
+                name=f"{tag}-{i}", location=tag, latitude=14.6, longitude=121.0,
+                donation_type='food', urgency=3.0, contact='n/a'
+            )
+            for i in range(options['recipients'])
+        ]
+        rng = np.random.default_rng()
+        retrying = rng.random(options['donors']) < options['retry_rate']
+
+        results = []
+        results_lock = threading.Lock()
+        barrier = threading.Barrier(options['donors'])
+
+        def donor(index):
+            client = Client()
+            key = uuid.uuid4().hex
+            body = json.dumps({
+                'donor_name': f"{tag}-donor-{index}",
+                'donor_contact': 'n/a',
+                'donation_type': 'food',
+                'pickup_location': tag,
+                'recipient_id': recipients[index % len(recipients)].id,
+            })
+            barrier.wait()
+            try:
+                for _ in range(2 if retrying[index] else 1):
+                    start = time.perf_counter()
+                    response = client.post('/api/donate', body, content_type='application/json',
+                                           HTTP_IDEMPOTENCY_KEY=key)
+                    elapsed = time.perf_counter() - start
+                    payload = json.loads(response.content)
+                    with results_lock:
+                        results.append((key, response.status_code, payload.get('replayed', False), elapsed))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=donor, args=(i,)) for i in range(options['donors'])]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        try:
+            problems = self.verify(tag, recipients, results)
+            incremental = stats_snapshot()
+            rebuild_stats()
+            if stats_snapshot() != incremental:
+                problems.append('incrementally maintained stats drifted from a full rebuild')
+        finally:
+            if not options['keep']:
+                DonatedRecipient.objects.filter(location=tag).delete()
+                Recipient.objects.filter(location=tag).delete()  # Cascades to the Donation rows
+
+        statuses = Counter(status for _, status, _, _ in results)
+        latencies = np.array([elapsed for *_, elapsed in results]) * 1000
+        self.stdout.write(
+            f"{len(results)} requests from {options['donors']} donors in {wall:.2f}s "
+            f"({len(results) / wall:.1f} req/s), p50 {np.percentile(latencies, 50):.1f} ms, "
+            f"p99 {np.percentile(latencies, 99):.1f} ms"
+        )
+        self.stdout.write(f"Statuses: {dict(sorted(statuses.items()))}, "
+                          f"replays: {sum(1 for _, _, replayed, _ in results if replayed)}")
+
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write(self.style.SUCCESS('No double claims, no lost donations'))
+
+    def verify(self, tag, recipients, results):
+        problems = []
+        accepted = {key for key, status, replayed, _ in results if status == 200 and not replayed}
+        replayed = {key for key, status, replayed, _ in results if status == 200 and replayed}
+        errors = [status for _, status, _, _ in results if status not in (200, 409)]
+        if errors:
+            problems.append(f"{len(errors)} requests failed: {dict(Counter(errors))}")
+
+        per_recipient = Donation.objects.filter(recipient__in=recipients) \
+                                        .values('recipient').annotate(n=Count('id'))
+        doubles = [row['recipient'] for row in per_recipient if row['n'] > 1]
+        if doubles:
+            problems.append(f"recipients claimed more than once: {doubles}")
+
+        stored_keys = set(Donation.objects.filter(recipient__in=recipients)
+                                          .values_list('idempotency_key', flat=True))
+        if accepted - stored_keys:
+            problems.append(f"{len(accepted - stored_keys)} accepted donations were not stored")
+        if stored_keys - accepted:
+            problems.append(f"{len(stored_keys - accepted)} stored donations were never acknowledged")
+        if replayed - accepted:
+            problems.append('a replay answered for a donation that was never accepted')
+
+        claimed = Recipient.objects.filter(location=tag, status='claimed').count()
+        donated = DonatedRecipient.objects.filter(location=tag).count()
+        if not claimed == donated == len(accepted):
+            problems.append(f"claimed recipients ({claimed}), history rows ({donated}) and "
+                            f"accepted donations ({len(accepted)}) disagree")
+        return problems
@@ -0,0 +1,233 @@
+import http.client
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from urllib.parse import urlencode, urlsplit
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from donations.management.commands.benchmark_text_matcher import make_text
+from donations.synthetic import BARANGAYS_PER_CITY, CITIES, DONATION_TYPES
+
+def process_tree_rss(pid):
+    """Resident memory in bytes of ``pid`` and its descendants, by pid (Linux /proc)."""
+    rss = {}
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f'/proc/{current}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        rss[current] = int(line.split()[1]) * 1024
+            for task in os.listdir(f'/proc/{current}/task'):
+                with open(f'/proc/{current}/task/{task}/children') as f:
+                    pending += [int(child) for child in f.read().split()]
+        except (FileNotFoundError, ProcessLookupError):
+            continue  # Exited while we looked
+    return rss
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, status, elapsed):
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            self.statuses[endpoint][status] += 1
+
+class Command(BaseCommand):
+    help = ('Replay the index page traffic mix (page load, type detection while typing, '
+            'recipient search, donation) against a running server and report throughput, '
+            'latency percentiles and error rates per endpoint. Start the server with '
+            'GEOCODER_BACKEND=donations.synthetic.SyntheticGeocoder on data from '
+            'seed_synthetic; donations claim recipients for real.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server')
+        parser.add_argument('--concurrency', type=int, default=10, help='Simultaneous users')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run')
+        parser.add_argument('--think-time-ms', type=float, default=0,
+                            help='Mean pause between a user\'s requests (exponential)')
+        parser.add_argument('--donate-rate', type=float, default=0.3,
+                            help='Fraction of visits that end in a donation')
+        parser.add_argument('--server-pid', type=int,
+                            help='Sample memory of this process and its workers (e.g. the gunicorn master)')
+        parser.add_argument('--timeout', type=float, default=30, help='Seconds per request')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+
+    def handle(self, *args, **options):
+        target = urlsplit(options['url'])
+        if target.scheme not in ('http', 'https') or not target.hostname:
+            raise CommandError(f"Not an http(s) URL: {options['url']}")
+
+        recorder = Recorder()
+        deadline = time.monotonic() + options['duration']
+        memory = {'peak': 0, 'samples': []}
+        stop = threading.Event()
+
+        def sample_memory():
+            while not stop.is_set():
+                total = sum(process_tree_rss(options['server_pid']).values())
+                memory['peak'] = max(memory['peak'], total)
+                memory['samples'].append(total)
+                stop.wait(0.5)
+
+        def user(index):
+            rng = random.Random(options['seed'] * 100003 + index)
+            session = Session(target, options['timeout'], recorder, rng, options['think_time_ms'])
+            try:
+                while time.monotonic() < deadline:
+                    session.visit(options['donate_rate'])
+            finally:
+                session.close()
+
+        if options['server_pid']:
+            if not os.path.exists(f"/proc/{options['server_pid']}"):
+                raise CommandError(f"No process {options['server_pid']} (memory sampling needs Linux /proc)")
+            threading.Thread(target=sample_memory, daemon=True).start()
+
+        threads = [threading.Thread(target=user, args=(i,)) for i in range(options['concurrency'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+        stop.set()
+
+        report = self.report(recorder, wall, memory, options)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+
+    def report(self, recorder, wall, memory, options):
+        endpoints = {}
+        self.stdout.write(f"{'endpoint':<32} {'requests':>8} {'req/s':>7} {'p50 ms':>7} {'p95 ms':>7} "
+                          f"{'p99 ms':>7} {'errors':>7} {'4xx':>6}")
+        for endpoint in sorted(recorder.latencies):
+            latencies = np.array(recorder.latencies[endpoint]) * 1000
+            statuses = recorder.statuses[endpoint]
+            count = len(latencies)
+            # Transport failures (status 0) and 5xx are errors; 4xx such as
+            # a 409 for an already claimed recipient are expected answers
+            errors = sum(n for status, n in statuses.items() if status == 0 or status >= 500)
+            rejected = sum(n for status, n in statuses.items() if 400 <= status < 500)
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+            endpoints[endpoint] = {
+                'requests': count,
+                'requests_per_second': round(count / wall, 2),
+                'p50_ms': round(p50, 1), 'p95_ms': round(p95, 1), 'p99_ms': round(p99, 1),
+                'error_rate': round(errors / count, 4),
+                'client_error_rate': round(rejected / count, 4),
+                'statuses': {str(status): n for status, n in sorted(statuses.items())},
+            }
+            self.stdout.write(f"{endpoint:<32} {count:>8} {count / wall:>7.1f} {p50:>7.0f} {p95:>7.0f} "
+                              f"{p99:>7.0f} {errors / count:>7.1%} {rejected / count:>6.1%}")
+
+        total = sum(result['requests'] for result in endpoints.values())
+        failed = sum(round(result['error_rate'] * result['requests']) for result in endpoints.values())
+        summary = {
+            'seconds': round(wall, 2),
+            'concurrency': options['concurrency'],
+            'requests': total,
+            'requests_per_second': round(total / wall, 2) if wall else 0.0,
+            'error_rate': round(failed / total, 4) if total else 0.0,
+        }
+        self.stdout.write(f"{total} requests in {wall:.1f}s from {options['concurrency']} users: "
+                          f"{summary['requests_per_second']} req/s, {summary['error_rate']:.1%} errors")
+        if options['server_pid'] and memory['samples']:
+            summary['server_rss_peak_mb'] = round(memory['peak'] / 2 ** 20, 1)
+            summary['server_rss_final_mb'] = round(memory['samples'][-1] / 2 ** 20, 1)
+            self.stdout.write(f"Server memory (all processes): peak {summary['server_rss_peak_mb']} MB, "
+                              f"final {summary['server_rss_final_mb']} MB")
+        return {'summary': summary, 'endpoints': endpoints}
+
+class Session:
+    """One simulated browser, replaying index.html visits over a keep-alive connection."""
+
+    def __init__(self, target, timeout, recorder, rng, think_time_ms):
+        self.target = target
+        self.timeout = timeout
+        self.recorder = recorder
+        self.rng = rng
+        self.think_time = think_time_ms / 1000
+        self.connection = None
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def request(self, endpoint, method, path, body=None, headers=None):
+        """Send one request; returns the decoded JSON body (or None) and the status."""
+        if self.think_time:
+            time.sleep(self.rng.expovariate(1 / self.think_time))
+        headers = dict(headers or {})
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        start = time.perf_counter()
+        try:
+            if self.connection is None:
+                connection_class = (http.client.HTTPSConnection if self.target.scheme == 'https'
+                                    else http.client.HTTPConnection)
+                self.connection = connection_class(self.target.hostname, self.target.port, timeout=self.timeout)
+            self.connection.request(method, self.target.path.rstrip('/') + path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self.close()  # Reconnect on the next request
+            self.recorder.record(endpoint, 0, time.perf_counter() - start)
+            return None, 0
+        self.recorder.record(endpoint, status, time.perf_counter() - start)
+        try:
+            return json.loads(content), status
+        except ValueError:
+            return None, status
+
+    def visit(self, donate_rate):
+        rng = self.rng
+        # Page load: the page, then the three widgets it fills in
+        self.request('GET /', 'GET', '/')
+        self.request('GET /api/trending', 'GET', '/api/trending')
+        self.request('GET /api/summary_stats', 'GET', '/api/summary_stats')
+        self.request('GET /api/history', 'GET', '/api/history')
+
+        # Typing a description: the debounce fires every few words
+        text = make_text(rng.randint(6, 30), 0.15, rng)
+        words = text.split()
+        detected = []
+        for cut in sorted(rng.sample(range(1, len(words) + 1), min(len(words), rng.randint(1, 3)))):
+            data, _ = self.request('POST /api/detect_donation_type/', 'POST', '/api/detect_donation_type/',
+                                   body={'text': ' '.join(words[:cut])})
+            detected = (data or {}).get('matches') or detected
+
+        # Search near one of the seeded cities
+        donation_type = detected[0] if detected else rng.choice(list(DONATION_TYPES))
+        city = rng.choice(CITIES)[0]
+        location = f"Barangay {rng.randint(1, BARANGAYS_PER_CITY)}, {city}"
+        data, _ = self.request('GET /api/recipients/', 'GET', '/api/recipients/?' + urlencode(
+            {'type': donation_type, 'location': location}))
+        recipients = (data or {}).get('recipients') or []
+
+        if recipients and rng.random() < donate_rate:
+            recipient = rng.choice(recipients[:5])
+            self.request('POST /api/donate/', 'POST', '/api/donate/', headers={
+                'Idempotency-Key': uuid.UUID(int=rng.getrandbits(128)).hex,
+            }, body={
+                'donor_name': f"Load test donor {rng.randint(1, 500)}",
+                'donor_contact': f"09{rng.randint(0, 10 ** 9 - 1):09d}",
+                'donation_type': donation_type,
+                'donor_location': location,
+                'pickup_location': location,
+                'recipient_id': recipient['id'],
+            })
@@ -0,0 +1,33 @@
+import time
+from django.core.management.base import BaseCommand
+from donations.ml.scheduler import get_debounce_seconds, run_pending_retrain
+
+class Command(BaseCommand):
+    help = 'Run pending model retrain jobs (coalesced into a single fit)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep polling for new jobs instead of exiting')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds between polls in --loop mode')
+        parser.add_argument('--debounce', type=float, default=None,
+                            help='Only run jobs idle for this many seconds '
+                                 '(default: RETRAIN_DEBOUNCE_SECONDS)')
+        parser.add_argument('--full', action='store_true',
+                            help='Refit the urgency model from scratch instead of '
+                                 'updating it incrementally')
+
+    def handle(self, *args, **options):
+        debounce = options['debounce']
+        if debounce is None:
+            debounce = get_debounce_seconds()
+
+        while True:
+            processed = run_pending_retrain(debounce=debounce, full=options['full'])
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'Retrained models for {processed} job(s)'))
+            if not options['loop']:
+                if not processed:
+                    self.stdout.write('No pending retrain jobs')
+                break
+            time.sleep(options['interval'])
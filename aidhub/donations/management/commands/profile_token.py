@@ -0,0 +1,11 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from donations.profiling import PROFILE_HEADER, make_profile_token
+
+class Command(BaseCommand):
+    help = 'Print a signed header that makes the profiled views capture a cProfile of the request'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{PROFILE_HEADER}: {make_profile_token()}")
+        self.stderr.write(f"Valid for {settings.PROFILE_TOKEN_MAX_AGE} seconds; captures are listed "
+                          f"in the admin under Profile captures")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from donations.stats import get_summary, rebuild_stats
+from donations.utils.response_cache import invalidate_api_cache
+
+class Command(BaseCommand):
+    help = 'Recompute the per-type, distinct donor/location and summary counter tables from scratch'
+
+    def handle(self, *args, **options):
+        rebuild_stats()
+        invalidate_api_cache()
+        summary = get_summary()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt stats: {summary['total_donations']} donations, "
+            f"{summary['unique_donors']} donors, {summary['communities_served']} communities"
+        ))
@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from donations.models import Donation, Recipient, DonatedRecipient
+from donations.stats import rebuild_stats
+from donations.synthetic import truncate_data
+from donations.utils.response_cache import invalidate_api_cache
 
 class Command(BaseCommand):
     help = 'Reset all data in the database while keeping the structure'
@@ -7,10 +9,10 @@ class Command(BaseCommand):
     def handle(self, *args, **options):
         self.stdout.write('Deleting all data...')
         
-        # Delete all data from existing models
-        DonatedRecipient.objects.all().delete()  # Delete this first due to relationships
-        Recipient.objects.all().delete()
-        Donation.objects.all().delete()
+        # Truncate rather than delete through the ORM, which loads every row
+        truncate_data()
+        rebuild_stats()  # Reset the aggregate tables to match
+        invalidate_api_cache()
         
         self.stdout.write(self.style.SUCCESS('Successfully cleared all data'))
 
@@ -0,0 +1,223 @@
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from donations.management.commands.benchmark_image_classifier import make_images
+from donations.management.commands.benchmark_text_matcher import make_text
+from donations.ml import registry, trainer
+from donations.synthetic import SyntheticGeocoder, seed_synthetic, truncate_data
+from donations.utils.geocoding import Geocoder, get_geocoder, set_geocoder
+from donations.utils.response_cache import invalidate_api_cache
+from donations.utils.text_matcher import match_donation_text
+
+VIEW_REQUESTS = {
+    'recipients': ('/api/recipients', {'type': 'food', 'location': 'Quezon City', 'radius': 25}),
+    'history': ('/api/history', {}),
+    'summary_stats': ('/api/summary_stats', {}),
+    'trending': ('/api/trending', {}),
+}
+TRAINERS = {
+    'train_model': trainer.train_model,
+    'train_trend_model': trainer.train_trend_model,
+}
+CASES = list(VIEW_REQUESTS) + list(TRAINERS) + ['match_donation_text', 'classify_image']
+
+@contextmanager
+def isolated_models(directory):
+    # Trained models go to a scratch directory, never over the served ones
+    paths = trainer.MODEL_FILE, trainer.TREND_MODEL_FILE, registry.registry
+    trainer.MODEL_FILE = f"{directory}/donation_matcher.pkl"
+    trainer.TREND_MODEL_FILE = f"{directory}/trend_predictor.pkl"
+    registry.registry = registry.ModelRegistry(path=trainer.MODEL_FILE)
+    try:
+        yield
+    finally:
+        trainer.MODEL_FILE, trainer.TREND_MODEL_FILE, registry.registry = paths
+
+def time_rounds(fn, rounds, warmup=True):
+    if warmup:
+        fn()
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'median_ms': round(statistics.median(timings), 3),
+        'min_ms': round(min(timings), 3),
+        'max_ms': round(max(timings), 3),
+        'rounds': rounds,
+    }
+
+class Command(BaseCommand):
+    help = ('Time the API views, model training, text matching and image classification '
+            'on a test database seeded at fixed sizes; write JSON and optionally compare '
+            'against a baseline. On SQLite, check_query_plans runs on the first size. Use '
+            'DATABASE_URL=sqlite:///... for results comparable with a SQLite baseline.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Recipients to seed per run (half of them claimed)')
+        parser.add_argument('--cases', nargs='+', choices=CASES, default=CASES)
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Timed rounds per case; training runs once per size')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--compare', help='Baseline JSON from an earlier --output')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Flag cases whose median is this fraction slower than the baseline')
+        parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                            help='Ignore slowdowns smaller than this, which are noise')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        results = {}
+        original_geocoder = get_geocoder()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with tempfile.TemporaryDirectory() as model_dir, isolated_models(model_dir), \
+                    override_settings(
+                        # Views are timed uncached, without touching the shared cache
+                        CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                            'LOCATION': 'aidhub-benchmarks'}},
+                        # One image at a time, so batching doesn't add its wait
+                        IMAGE_CLASSIFIER_BATCHING=False,
+                        SLOW_REQUEST_THRESHOLD_MS=0,
+                    ):
+                set_geocoder(Geocoder(backend=SyntheticGeocoder()))
+                for size in options['sizes']:
+                    results.update(self.run_size(size, options))
+                results.update(self.run_standalone(options))
+        finally:
+            set_geocoder(original_geocoder)
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        report = {
+            'meta': {
+                'created_at': timezone.now().isoformat(),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'machine': platform.machine(),
+                'sizes': options['sizes'],
+                'repeat': options['repeat'],
+                'seed': options['seed'],
+            },
+            'results': results,
+        }
+        self.print_results(results)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Wrote {options['output']}")
+        if baseline is not None:
+            self.compare(report, baseline, options)
+
+    def run_size(self, size, options):
+        truncate_data()
+        seed_synthetic(recipients=size, seed=options['seed'])
+        if connection.vendor == 'sqlite' and size == options['sizes'][0]:
+            # Plans depend on the data, so check them once there is some.
+            # Fails the run, like a regression, if a hot query lost its index
+            call_command('check_query_plans', stdout=self.stderr)
+        client = Client()
+        results = {}
+
+        # Trainers first, so the views use a model fitted to this size
+        for name, train in TRAINERS.items():
+            if name not in options['cases']:
+                continue
+
+            def run():
+                if train() is None:
+                    raise CommandError(f"{name} produced no model at size {size}")
+
+            results[f"{name}@{size}"] = time_rounds(run, 1, warmup=False)
+            self.stderr.write(f"  {name}@{size}: {results[f'{name}@{size}']['median_ms']:.1f} ms")
+
+        for name in VIEW_REQUESTS:
+            if name not in options['cases']:
+                continue
+            url, params = VIEW_REQUESTS[name]
+
+            def request():
+                invalidate_api_cache()  # Measure the view, not a cache hit
+                response = client.get(url, params)
+                if response.status_code != 200:
+                    raise CommandError(f"{url} returned {response.status_code} at size {size}")
+
+            results[f"{name}@{size}"] = time_rounds(request, options['repeat'])
+            self.stderr.write(f"  {name}@{size}: {results[f'{name}@{size}']['median_ms']:.1f} ms")
+        return results
+
+    def run_standalone(self, options):
+        # Cases that don't read the database run once, not per size
+        results = {}
+        if 'match_donation_text' in options['cases']:
+            rng = random.Random(options['seed'])
+            texts = [make_text(200, 0.01, rng) for _ in range(200)]
+
+            def match_all():
+                for text in texts:
+                    match_donation_text(text)
+
+            results['match_donation_text'] = time_rounds(match_all, options['repeat'])
+
+        if 'classify_image' in options['cases']:
+            from donations.ml.image_classifier import classify_image, get_classifier
+            if get_classifier().model is None:
+                self.stderr.write('Skipping classify_image: no image classifier weights')
+            else:
+                image = make_images(1, seed=options['seed'])[0]
+                results['classify_image'] = time_rounds(lambda: classify_image(image), options['repeat'])
+        return results
+
+    def print_results(self, results):
+        self.stdout.write(f"{'case':<32} {'median ms':>10} {'min ms':>10} {'max ms':>10}")
+        for name, result in results.items():
+            self.stdout.write(f"{name:<32} {result['median_ms']:>10.2f} "
+                              f"{result['min_ms']:>10.2f} {result['max_ms']:>10.2f}")
+
+    def compare(self, report, baseline, options):
+        if baseline['meta'].get('database') != report['meta']['database']:
+            self.stderr.write(self.style.WARNING(
+                f"Baseline ran on {baseline['meta'].get('database')}, this run on "
+                f"{report['meta']['database']}; timings are not comparable"
+            ))
+
+        regressions = []
+        self.stdout.write(f"\n{'case':<32} {'baseline':>10} {'current':>10} {'change':>8}")
+        for name, result in report['results'].items():
+            before = baseline['results'].get(name)
+            if before is None:
+                self.stdout.write(f"{name:<32} {'-':>10} {result['median_ms']:>10.2f}      new")
+                continue
+            change = result['median_ms'] / before['median_ms'] - 1 if before['median_ms'] else 0.0
+            regressed = (change > options['threshold']
+                         and result['median_ms'] - before['median_ms'] > options['min_delta_ms'])
+            line = (f"{name:<32} {before['median_ms']:>10.2f} {result['median_ms']:>10.2f} "
+                    f"{change:>+7.0%}")
+            if regressed:
+                regressions.append(name)
+                line = self.style.ERROR(f"{line}  REGRESSION")
+            self.stdout.write(line)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} cases regressed by more than "
+                               f"{options['threshold']:.0%}: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from donations.synthetic import seed_synthetic, truncate_data
+
+class Command(BaseCommand):
+    help = ('Fill the database with synthetic recipients, claimed donations and donation '
+            'history at realistic scale, for load testing and benchmarks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=10000)
+        parser.add_argument('--donations', type=int, default=None,
+                            help='Recipients to mark claimed, each with a Donation and a history row '
+                                 '(default: half of --recipients)')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--days', type=int, default=365, help='How far back timestamps go')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Rows per executemany call')
+        parser.add_argument('--reset', action='store_true', help='Empty the tables first')
+
+    def handle(self, *args, **options):
+        if options['recipients'] < 0 or (options['donations'] or 0) < 0 or options['days'] < 1:
+            raise CommandError('--recipients and --donations must be positive and --days at least 1')
+        if options['reset']:
+            truncate_data()
+            self.stdout.write('Emptied recipient, donation and history tables')
+
+        written = seed_synthetic(
+            recipients=options['recipients'],
+            donations=options['donations'],
+            seed=options['seed'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {written['recipients']} recipients, {written['donations']} donations and "
+            f"{written['donated_recipients']} history rows"
+        ))
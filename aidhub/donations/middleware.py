@@ -0,0 +1,58 @@
+import logging
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from . import instrumentation
+
+logger = logging.getLogger('aidhub')
+
+class RequestMetricsMiddleware:
+    """Record wall time, SQL, geocoding and ML time for every request.
+
+    Results go to the histograms served at /metrics, labelled by URL route.
+    Requests slower than SLOW_REQUEST_THRESHOLD_MS are logged as warnings.
+    Streaming responses are timed until the response starts.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token, timings = instrumentation.start_request()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            instrumentation.end_request(token)
+            self.finish(request, response, timings)
+
+    async def __acall__(self, request):
+        token, timings = instrumentation.start_request()
+        response = None
+        try:
+            response = await self.get_response(request)
+            return response
+        finally:
+            instrumentation.end_request(token)
+            self.finish(request, response, timings)
+
+    def finish(self, request, response, timings):
+        match = getattr(request, 'resolver_match', None)
+        # Routes keep label values bounded; both slash variants share one
+        view = '/' + match.route.rstrip('/') if match else 'unmatched'
+        status = response.status_code if response is not None else 500
+        instrumentation.record_request(timings, view, request.method, status)
+
+        elapsed_ms = timings.elapsed() * 1000
+        if settings.SLOW_REQUEST_THRESHOLD_MS and elapsed_ms > settings.SLOW_REQUEST_THRESHOLD_MS:
+            phases = ', '.join(f"{phase} {seconds * 1000:.0f} ms"
+                               for phase, seconds in timings.phases.items())
+            logger.warning(f"Slow request: {request.method} {request.get_full_path()} returned {status} "
+                           f"in {elapsed_ms:.0f} ms ({timings.queries} queries; {phases or 'no SQL'})")
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:03
+
+from django.db import migrations, models
+
+
+def populate_geohash(apps, schema_editor):
+    from donations.utils.geo import encode_geohash
+
+    Recipient = apps.get_model('donations', 'Recipient')
+    recipients = list(Recipient.objects.only('id', 'latitude', 'longitude'))
+    for recipient in recipients:
+        recipient.geohash = encode_geohash(recipient.latitude, recipient.longitude)
+    Recipient.objects.bulk_update(recipients, ['geohash'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0004_geocodecache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipient',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, max_length=12),
+        ),
+        migrations.RunPython(populate_geohash, migrations.RunPython.noop),
+    ]
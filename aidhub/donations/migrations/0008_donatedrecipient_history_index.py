@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0007_recipient_date_added_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donatedrecipient',
+            index=models.Index(fields=['transaction_date', 'id'], name='donated_txn_date_id_idx'),
+        ),
+    ]
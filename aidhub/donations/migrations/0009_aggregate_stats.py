@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:22
+
+from django.db import migrations, models
+
+
+def populate_stats(apps, schema_editor):
+    from donations.stats import rebuild_stats
+
+    rebuild_stats(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0008_donatedrecipient_history_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DistinctDonor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('donor_name', models.CharField(max_length=200, unique=True)),
+                ('refcount', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DistinctLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=200, unique=True)),
+                ('refcount', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DonationTypeStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('recipient', 'Open recipients'), ('donated', 'Completed donations')], max_length=20)),
+                ('donation_type', models.CharField(max_length=100)),
+                ('count', models.IntegerField(default=0)),
+                ('urgency_sum', models.FloatField(default=0.0)),
+            ],
+            options={
+                'unique_together': {('source', 'donation_type')},
+            },
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
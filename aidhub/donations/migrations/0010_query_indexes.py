@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0009_aggregate_stats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='donatedrecipient',
+            index=models.Index(fields=['donation_type', 'urgency'], name='donated_type_urgency_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donatedrecipient',
+            index=models.Index(fields=['donor_name'], name='donated_donor_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['donor_name'], name='donation_donor_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipient',
+            index=models.Index(fields=['donation_type', 'urgency'], name='recipient_type_urgency_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:25
+
+from django.db import migrations, models
+
+
+def refresh_stats(apps, schema_editor):
+    # The donation total now counts DonatedRecipient rows only
+    from donations.stats import rebuild_stats
+
+    rebuild_stats(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0010_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='idempotency_key',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name='recipient',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='recipient',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('claimed', 'Claimed')], db_index=True, default='open', max_length=20),
+        ),
+        migrations.RunPython(refresh_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0012_profiling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donatedrecipient',
+            name='recipient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='donations.recipient'),
+        ),
+    ]
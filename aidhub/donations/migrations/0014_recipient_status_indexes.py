@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('donations', '0013_donatedrecipient_recipient'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipient',
+            name='status',
+            field=models.CharField(choices=[('open', 'Open'), ('claimed', 'Claimed')], default='open', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='recipient',
+            index=models.Index(fields=['status', 'donation_type', 'geohash'], name='recipient_open_type_geo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipient',
+            index=models.Index(fields=['status', 'date_added'], name='recipient_open_date_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+logger = logging.getLogger('aidhub')
+
+class MicroBatcher:
+    """Collects concurrent requests into batches for one inference call.
+
+    Callers ``submit()`` single items and get a Future back. A background
+    thread waits for the first item and, if others are already queued behind
+    it, keeps collecting until either ``max_batch_size`` items are queued or
+    ``max_wait_ms`` has passed, then
+    calls ``infer_fn(items)`` once and hands each caller its own result.
+    ``infer_fn`` must return one result per item, in order.
+    """
+
+    def __init__(self, infer_fn, max_batch_size=16, max_wait_ms=10, name='batcher'):
+        self.infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._batch_sizes = {}  # batch size -> number of batches
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def predict(self, item, timeout=None):
+        return self.submit(item).result(timeout=timeout)
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self._queue.qsize(),
+                'batches': self._batches,
+                'items': self._items,
+                'mean_batch_size': self._items / self._batches if self._batches else 0.0,
+                'batch_sizes': dict(sorted(self._batch_sizes.items())),
+            }
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        if self._queue.empty():
+            # A lone request: waiting would only add latency
+            return batch
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.infer_fn(items)
+            except Exception as e:
+                logger.error(f"Batched inference failed: {e}")
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._batch_sizes[len(batch)] = self._batch_sizes.get(len(batch), 0) + 1
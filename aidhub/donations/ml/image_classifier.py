@@ -1,9 +1,14 @@
-import torch
-import torchvision.transforms as transforms
-from torchvision.models import resnet18
-from PIL import Image
 import io
 import logging
+import os
+import threading
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from PIL import Image
+from ..instrumentation import timed
+
+# torch and torchvision are imported lazily, so workers that never classify
+# an image never pay for loading them
 
 logger = logging.getLogger('aidhub')
 
@@ -13,23 +18,194 @@ DONATION_CATEGORIES = [
     'toys', 'furniture', 'hygiene', 'school_supplies', 'other'
 ]
 
+# ImageNet class ranges for each donation category. Ranges overlap; the
+# first category listed wins, and unlisted classes count as 'other'.
+CATEGORY_MAPPINGS = {
+    'clothes': [(400, 460), (600, 620)],
+    'food': [(920, 960), (980, 990)],
+    'electronics': [(500, 600)],
+    'medicine': [(520, 530)],
+    'books': [(970, 980)],
+    'toys': [(850, 870)],
+    'furniture': [(750, 780)],
+    'hygiene': [(630, 650)],
+    'supplies': [(760, 770)],
+}
+MAPPED_CATEGORIES = list(CATEGORY_MAPPINGS) + ['other']
+IMAGENET_CLASSES = 1000
+
+_category_index = None
+
+def category_index():
+    """(1, 1000) LongTensor giving the MAPPED_CATEGORIES index of every ImageNet class."""
+    global _category_index
+    if _category_index is None:
+        import torch
+
+        index = torch.full((IMAGENET_CLASSES,), MAPPED_CATEGORIES.index('other'), dtype=torch.long)
+        assigned = torch.zeros(IMAGENET_CLASSES, dtype=torch.bool)
+        for category_id, ranges in enumerate(CATEGORY_MAPPINGS.values()):
+            for start, stop in ranges:
+                free = ~assigned[start:stop]
+                index[start:stop][free] = category_id
+                assigned[start:stop] = True
+        _category_index = index.unsqueeze(0)
+    return _category_index
+
+def get_weights_path():
+    return getattr(settings, 'IMAGE_CLASSIFIER_WEIGHTS',
+                   os.path.join(settings.BASE_DIR, 'donations', 'ml', 'models', 'resnet18.pth'))
+
+def download_weights(path=None):
+    """Fetch the pretrained ResNet18 weights once and store them locally."""
+    import torch
+    from torchvision.models import resnet18, ResNet18_Weights
+
+    path = path or get_weights_path()
+    state_dict = resnet18(weights=ResNet18_Weights.IMAGENET1K_V1).state_dict()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(state_dict, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def build_transform():
+    import torchvision.transforms as transforms
+
+    return transforms.Compose([
+        transforms.Resize(256),
+        transforms.CenterCrop(224),
+        transforms.ToTensor(),
+        transforms.Normalize(
+            mean=[0.485, 0.456, 0.406],
+            std=[0.229, 0.224, 0.225]
+        )
+    ])
+
+def load_image_folder(path, transform, limit=None):
+    """Preprocessed (1, 3, 224, 224) tensors for the images in ``path``."""
+    names = sorted(n for n in os.listdir(path) if n.lower().endswith(IMAGE_EXTENSIONS))
+    tensors = []
+    for name in names[:limit]:
+        with Image.open(os.path.join(path, name)) as image:
+            tensors.append(transform(image.convert('RGB')).unsqueeze(0))
+    return tensors
+
+# Selectable CPU inference modes (IMAGE_CLASSIFIER_MODE)
+INFERENCE_MODES = ('eager', 'dynamic_int8', 'static_int8', 'torchscript', 'compile')
+
+def load_resnet18(weights_path, quantizable=False):
+    """Build ResNet18 with its weights memory-mapped from ``weights_path``.
+
+    The model skeleton is created on the meta device (no allocation) and
+    the mmapped tensors are assigned in place, so the weights live in the
+    page cache and are shared by every worker that maps the same file.
+    ``quantizable`` builds torchvision's QuantizableResNet instead, which
+    has the same weights plus quant/dequant stubs for static int8.
+    """
+    import torch
+    if quantizable:
+        from torchvision.models.quantization import resnet18
+    else:
+        from torchvision.models import resnet18
+
+    kwargs = {'quantize': False} if quantizable else {}
+    state_dict = torch.load(weights_path, mmap=True, weights_only=True, map_location='cpu')
+    with torch.device('meta'):
+        model = resnet18(weights=None, **kwargs)
+    model.load_state_dict(state_dict, assign=True)
+    return model
+
+def build_inference_model(weights_path, mode='eager', channels_last=False, calibration_batches=None):
+    """Load ResNet18 and prepare it for CPU inference in ``mode``.
+
+    - eager: fp32 eager mode; the only mode that keeps weights mmapped
+    - dynamic_int8: int8 weights for the Linear head (convs stay fp32)
+    - static_int8: fused, fully int8 model calibrated on
+      ``calibration_batches`` of real images (required)
+    - torchscript: traced, frozen and optimized for inference
+    - compile: torch.compile (first batch pays the compile time)
+    """
+    import torch
+
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown image classifier mode {mode!r}; expected one of {INFERENCE_MODES}")
+
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    example = torch.randn(1, 3, 224, 224).to(memory_format=memory_format)
+
+    if mode == 'static_int8':
+        from torch.ao import quantization
+
+        if not calibration_batches:
+            # Activation ranges observed on noise would misquantize real photos
+            raise ImproperlyConfigured('static_int8 needs calibration images (IMAGE_CLASSIFIER_CALIBRATION_DIR)')
+
+        model = load_resnet18(weights_path, quantizable=True).eval()
+        model.fuse_model()
+        engine = 'x86' if 'x86' in torch.backends.quantized.supported_engines else 'qnnpack'
+        torch.backends.quantized.engine = engine
+        model.qconfig = quantization.get_default_qconfig(engine)
+        quantization.prepare(model, inplace=True)
+        with torch.no_grad():
+            for batch in calibration_batches:
+                model(batch)
+        return quantization.convert(model, inplace=True)
+
+    model = load_resnet18(weights_path).eval()
+    if channels_last:
+        model = model.to(memory_format=torch.channels_last)
+
+    if mode == 'dynamic_int8':
+        from torch.ao.quantization import quantize_dynamic
+        return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if mode == 'torchscript':
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example)
+            return torch.jit.optimize_for_inference(torch.jit.freeze(traced))
+    if mode == 'compile':
+        return torch.compile(model)
+    return model
+
 class DonationImageClassifier:
-    def __init__(self):
+    def __init__(self, weights_path=None, mode=None, threads=None, channels_last=None,
+                 calibration_dir=None):
         try:
-            # Load a lightweight pre-trained ResNet18 model
+            import torch
+
+            weights_path = weights_path or get_weights_path()
+            if not os.path.exists(weights_path):
+                logger.info(f"Image model weights not found at {weights_path}, downloading")
+                download_weights(weights_path)
+
+            self.mode = mode or getattr(settings, 'IMAGE_CLASSIFIER_MODE', 'eager')
+            if calibration_dir is None:
+                calibration_dir = getattr(settings, 'IMAGE_CLASSIFIER_CALIBRATION_DIR', '')
+            if self.mode == 'static_int8' and not calibration_dir:
+                logger.warning("static_int8 needs IMAGE_CLASSIFIER_CALIBRATION_DIR; using dynamic_int8")
+                self.mode = 'dynamic_int8'
+            threads = threads if threads is not None else getattr(settings, 'IMAGE_CLASSIFIER_THREADS', 0)
+            if threads:
+                torch.set_num_threads(threads)
+            if channels_last is None:
+                channels_last = getattr(settings, 'IMAGE_CLASSIFIER_CHANNELS_LAST', False)
+            # Static int8 kernels expect the default layout
+            self.channels_last = channels_last and self.mode != 'static_int8'
+
             self.device = torch.device('cpu')
-            self.model = resnet18(pretrained=True)
-            self.model.eval()
-            self.transform = transforms.Compose([
-                transforms.Resize(256),
-                transforms.CenterCrop(224),
-                transforms.ToTensor(),
-                transforms.Normalize(
-                    mean=[0.485, 0.456, 0.406],
-                    std=[0.229, 0.224, 0.225]
-                )
-            ])
-            logger.info("Image classification model loaded successfully")
+            self.transform = build_transform()
+
+            calibration_batches = None
+            if self.mode == 'static_int8':
+                images = load_image_folder(calibration_dir, self.transform, limit=64)
+                calibration_batches = [torch.cat(images[i:i + 8]) for i in range(0, len(images), 8)]
+
+            # Load a lightweight pre-trained ResNet18 model
+            self.model = build_inference_model(weights_path, self.mode, self.channels_last,
+                                               calibration_batches=calibration_batches)
+            logger.info(f"Image classification model loaded successfully ({self.mode} mode)")
         except Exception as e:
             logger.error(f"Error loading image classification model: {e}")
             self.model = None
@@ -65,44 +241,131 @@ class DonationImageClassifier:
             if processed_image is None:
                 return "other", 0.0
 
-            # Get predictions
-            with torch.no_grad():
-                output = self.model(processed_image)
-                probabilities = torch.nn.functional.softmax(output[0], dim=0)
-                confidence, predicted = torch.max(probabilities, 0)
-
-            # Map ImageNet category to donation category
-            mapped_category = self.map_to_donation_category(predicted.item())
-            
-            return mapped_category, float(confidence)
+            return self.classify_batch([processed_image])[0]
 
         except Exception as e:
             logger.error(f"Error classifying image: {e}")
             return "other", 0.0
+
+    def classify_batch(self, processed_images):
+        """Best donation category and its probability for each image."""
+        return [ranked[0] for ranked in self.rank_batch(processed_images, top_k=1)]
+
+    def rank_batch(self, processed_images, top_k=3):
+        """Run one forward pass over preprocessed (1, 3, 224, 224) tensors.
+
+        Returns, per image, the ``top_k`` donation categories with their
+        probability: the softmax mass of every ImageNet class mapped to the
+        category, summed in one scatter-add over the whole batch. Unmapped
+        classes add up under 'other', so each image's categories sum to 1.
+        The best mapped category ranks first if it has at least
+        IMAGE_CLASSIFIER_OTHER_THRESHOLD of the mass, else 'other' does;
+        the rest follow by probability. Unmapped classes are most of
+        ImageNet, so 'other' would nearly always have the most mass.
+        """
+        if self.model is None:
+            return [[("other", 0.0)]] * len(processed_images)
+
+        import torch
+
+        batch = torch.cat(processed_images)
+        if self.channels_last:
+            batch = batch.contiguous(memory_format=torch.channels_last)
+
+        # Get predictions
+        with torch.inference_mode():
+            probabilities = torch.nn.functional.softmax(self.model(batch), dim=1)
+            index = category_index().expand(len(batch), -1)
+            scores = torch.zeros(len(batch), len(MAPPED_CATEGORIES)).scatter_add_(1, index, probabilities)
+            # The last column collected the unmapped classes
+            best_mass, best = scores[:, :-1].max(dim=1)
+            confidences, categories = torch.sort(scores, dim=1, descending=True)
+
+        threshold = getattr(settings, 'IMAGE_CLASSIFIER_OTHER_THRESHOLD', 0.1)
+        other = len(MAPPED_CATEGORIES) - 1
+        ranked = []
+        for row_categories, row_confidences, row_best, row_best_mass in zip(
+                categories.tolist(), confidences.tolist(), best.tolist(), best_mass.tolist()):
+            top = row_best if row_best_mass >= threshold else other
+            row = [(MAPPED_CATEGORIES[top], row_confidences[row_categories.index(top)])]
+            row += [(MAPPED_CATEGORIES[c], p) for c, p in zip(row_categories, row_confidences) if c != top]
+            ranked.append(row[:top_k])
+        return ranked
             
     def map_to_donation_category(self, class_idx):
         try:
-            # Define category mappings with ImageNet indices
-            category_mappings = {
-                'clothes': list(range(400, 460)) + list(range(600, 620)),
-                'food': list(range(920, 960)) + list(range(980, 990)),
-                'electronics': list(range(500, 600)),
-                'medicine': list(range(520, 530)),
-                'books': list(range(970, 980)),
-                'toys': list(range(850, 870)),
-                'furniture': list(range(750, 780)),
-                'hygiene': list(range(630, 650)),
-                'supplies': list(range(760, 770))
-            }
-            
-            # Check which category the class index belongs to
-            for category, indices in category_mappings.items():
-                if class_idx in indices:
-                    return category
-                    
-            return 'other'
+            return MAPPED_CATEGORIES[int(category_index()[0, class_idx])]
         except Exception as e:
             logger.error(f"Error mapping category: {e}")
             return 'other'
 
-classifier = DonationImageClassifier()
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_classifier():
+    """The shared classifier, created on first use."""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = DonationImageClassifier()
+    return _classifier
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher():
+    """Shared micro-batcher feeding the classifier, created on first use."""
+    global _batcher
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                from .batching import MicroBatcher
+                classifier = get_classifier()
+                _batcher = MicroBatcher(
+                    # Full rankings, so callers can ask for any top_k
+                    lambda images: classifier.rank_batch(images, top_k=len(MAPPED_CATEGORIES)),
+                    max_batch_size=getattr(settings, 'IMAGE_BATCH_MAX_SIZE', 16),
+                    max_wait_ms=getattr(settings, 'IMAGE_BATCH_MAX_WAIT_MS', 10),
+                    name='aidhub-image-batcher',
+                )
+    return _batcher
+
+def batcher_stats():
+    """The shared batcher's stats, or None if it was never started."""
+    return _batcher.stats() if _batcher is not None else None
+
+@timed('ml_inference')
+def rank_image(image_data, top_k=None):
+    """Ranked ``[(category, probability), ...]`` for one image.
+
+    Batched with concurrent requests when IMAGE_CLASSIFIER_BATCHING is on;
+    decoding and resizing happen on the caller's thread and only the
+    forward pass is shared.
+    """
+    top_k = top_k or getattr(settings, 'IMAGE_CLASSIFIER_TOP_K', 3)
+    classifier = get_classifier()
+    if classifier.model is None:
+        return [("other", 0.0)]
+    processed_image = classifier.preprocess_image(image_data)
+    if processed_image is None:
+        return [("other", 0.0)]
+    try:
+        if getattr(settings, 'IMAGE_CLASSIFIER_BATCHING', False):
+            ranked = get_batcher().predict(processed_image, timeout=30)
+        else:
+            ranked = classifier.rank_batch([processed_image], top_k=len(MAPPED_CATEGORIES))[0]
+        return ranked[:top_k]
+    except Exception as e:
+        logger.error(f"Error classifying image: {e}")
+        return [("other", 0.0)]
+
+def classify_image(image_data):
+    """Best (category, probability) for one image."""
+    return rank_image(image_data, top_k=1)[0]
+
+def __getattr__(name):
+    # Backwards compatible lazy ``classifier`` module attribute
+    if name == 'classifier':
+        return get_classifier()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
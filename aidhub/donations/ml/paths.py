@@ -0,0 +1,8 @@
+import os
+from django.conf import settings
+
+# Where the trained models live. Kept apart from the trainer so code that
+# only serves predictions doesn't import the training stack to find them.
+MODEL_DIR = settings.ML_MODELS_DIR
+MODEL_FILE = os.path.join(MODEL_DIR, 'donation_matcher.pkl')
+TREND_MODEL_FILE = os.path.join(MODEL_DIR, 'trend_predictor.pkl')
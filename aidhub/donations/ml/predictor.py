@@ -1,39 +1,92 @@
-from geopy.geocoders import Nominatim
 import numpy as np
 import logging
 from datetime import datetime
 from django.db.models import Avg
 from ..models import Recipient, DonatedRecipient
+from ..utils.geocoding import ageocode, geocode
+from .registry import predict_batch
 
 logger = logging.getLogger('aidhub')
 
 def get_coordinates(location):
-    geolocator = Nominatim(user_agent="donation_ai")
     try:
-        loc = geolocator.geocode(location)
-        if loc:
-            return loc.latitude, loc.longitude
+        return geocode(location)
     except Exception as e:
         logger.error(f"Geocoding error: {e}")
     return None, None
 
-def predict_urgency(location, donation_type):
+async def aget_coordinates(location):
     try:
-        # Get average urgency from both current and historical data
-        current_avg = Recipient.objects.filter(donation_type=donation_type).aggregate(Avg('urgency'))['urgency__avg'] or 0
-        historical_avg = DonatedRecipient.objects.filter(donation_type=donation_type).aggregate(Avg('urgency'))['urgency__avg'] or 0
-        
+        return await ageocode(location)
+    except Exception as e:
+        logger.error(f"Geocoding error: {e}")
+    return None, None
+
+def urgency_average_queries(donation_types=None):
+    """Average urgency per type of open and of claimed recipients, one GROUP BY each."""
+    current = Recipient.objects.filter(status='open')
+    historical = DonatedRecipient.objects.all()
+    if donation_types is not None:
+        donation_types = set(donation_types)
+        current = current.filter(donation_type__in=donation_types)
+        historical = historical.filter(donation_type__in=donation_types)
+    return (current.values('donation_type').annotate(avg=Avg('urgency')),
+            historical.values('donation_type').annotate(avg=Avg('urgency')))
+
+def get_urgency_averages(donation_types=None):
+    """Combined average urgency per donation type, computed with one
+    GROUP BY query per table instead of two aggregates per lookup."""
+    current, historical = urgency_average_queries(donation_types)
+    current_avgs = {row['donation_type']: row['avg'] or 0 for row in current}
+    historical_avgs = {row['donation_type']: row['avg'] or 0 for row in historical}
+
+    averages = {}
+    for dtype in set(current_avgs) | set(historical_avgs):
+        current_avg = current_avgs.get(dtype, 0)
+        historical_avg = historical_avgs.get(dtype, 0)
         # Combine averages with weights
-        combined_avg = (current_avg * 0.7 + historical_avg * 0.3) if historical_avg > 0 else current_avg
-        
-        if combined_avg > 0:
-            # Add some randomization
-            urgency = max(1.5, min(5.0, combined_avg + np.random.normal(0, 0.3)))
-            return urgency, 0.7
-        
-        # Default values if no history
-        return 3.0, 0.5
-        
+        averages[dtype] = (current_avg * 0.7 + historical_avg * 0.3) if historical_avg > 0 else current_avg
+    return averages
+
+def _score_urgency(combined_avg):
+    if combined_avg > 0:
+        # Add some randomization
+        urgency = max(1.5, min(5.0, combined_avg + np.random.normal(0, 0.3)))
+        return urgency, 0.7
+
+    # Default values if no history
+    return 3.0, 0.5
+
+def predict_urgency(location, donation_type):
+    try:
+        combined_avg = get_urgency_averages([donation_type]).get(donation_type, 0)
+        return _score_urgency(combined_avg)
+
     except Exception as e:
         logger.error(f"Error in urgency prediction: {e}")
         return 3.0, 0.5
+
+def predict_urgency_batch(recipients):
+    """Score many recipients at once.
+
+    Returns a list of (urgency, confidence) tuples in the same order as
+    ``recipients``. Uses the trained model when one is available; otherwise
+    the per-type averages are fetched once for the whole batch, so the
+    number of queries does not depend on its size.
+    """
+    recipients = list(recipients)
+    try:
+        predicted = predict_batch(recipients)
+        if predicted is not None:
+            urgencies, confidences = predicted
+            return [(float(u), float(c)) for u, c in zip(urgencies, confidences)]
+    except Exception as e:
+        logger.error(f"Error in model urgency prediction: {e}")
+
+    try:
+        averages = get_urgency_averages({r.donation_type for r in recipients})
+        return [_score_urgency(averages.get(r.donation_type, 0)) for r in recipients]
+
+    except Exception as e:
+        logger.error(f"Error in batch urgency prediction: {e}")
+        return [(3.0, 0.5)] * len(recipients)
@@ -0,0 +1,133 @@
+import logging
+import os
+import threading
+from datetime import timezone as dt_timezone
+import joblib
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+from ..instrumentation import timed
+from .paths import MODEL_FILE
+
+logger = logging.getLogger('aidhub')
+
+class ModelRegistry:
+    """Keeps the trained urgency model in memory, once per worker.
+
+    Every access stats the model file and reloads it when the file has been
+    replaced (the trainer swaps files atomically, so a new inode, size or
+    mtime means a new model). Readers keep using the old model until the
+    new one is fully loaded.
+    """
+
+    def __init__(self, path=MODEL_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._version = None
+        self._model_data = None
+
+    def _file_version(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+    def get(self):
+        """Current model data dict, or None if no model has been trained."""
+        version = self._file_version()
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._load(version)
+        return self._model_data
+
+    def _load(self, version):
+        if version is None:
+            self._model_data = None
+        else:
+            try:
+                model_data = joblib.load(self.path)
+                model_data.setdefault('feature_columns', self._default_columns(model_data))
+                self._model_data = model_data
+                logger.info(f"Loaded urgency model from {self.path}")
+            except Exception as e:
+                logger.error(f"Error loading urgency model: {e}")
+                self._model_data = None
+        self._version = version
+
+    @staticmethod
+    def _default_columns(model_data):
+        # Column layout used by trainer.get_combined_dataset before the
+        # trainer started saving it explicitly
+        return (
+            ['latitude', 'longitude', 'donation_type_code']
+            + [f"type_{c}" for c in model_data['donation_categories']]
+            + ['day_of_week', 'day_of_month', 'month']
+        )
+
+    @timed('ml_inference')
+    def predict_batch(self, recipients):
+        """Vectorized urgency prediction from the trained model.
+
+        ``recipients`` are Recipient-like objects (saved or not) with
+        latitude, longitude, donation_type and date_added. Returns
+        ``(urgencies, confidences)`` arrays, or None when no model is
+        available.
+        """
+        model_data = self.get()
+        if model_data is None:
+            return None
+        recipients = list(recipients)
+        if not recipients:
+            return np.empty(0), np.empty(0)
+
+        X = self.build_features(model_data, recipients)
+        model = model_data['model']
+        urgencies = np.clip(model.predict(X), 1.5, 5.0)
+
+        if hasattr(model, 'estimators_'):
+            # Tree spread as an uncertainty estimate for forests
+            per_tree = np.stack([tree.predict(X.to_numpy()) for tree in model.estimators_])
+            confidences = np.clip(1.0 - per_tree.std(axis=0) / 2.0, 0.5, 0.95)
+        else:
+            confidences = np.full(len(recipients), 0.7)
+        return urgencies, confidences
+
+    @staticmethod
+    def build_features(model_data, recipients):
+        columns = model_data['feature_columns']
+        categories = model_data['donation_categories']
+        category_codes = {c: i for i, c in enumerate(categories)}
+        n = len(recipients)
+        now = timezone.now()
+
+        X = np.zeros((n, len(columns)), dtype=np.float64)
+        col = {name: i for i, name in enumerate(columns)}
+        codes = np.array([category_codes.get(r.donation_type, -1) for r in recipients])
+        dates = [(r.date_added or now).astimezone(dt_timezone.utc) for r in recipients]
+
+        X[:, col['latitude']] = [r.latitude for r in recipients]
+        X[:, col['longitude']] = [r.longitude for r in recipients]
+        X[:, col['donation_type_code']] = codes
+        X[:, col['day_of_week']] = [d.weekday() for d in dates]
+        X[:, col['day_of_month']] = [d.day for d in dates]
+        X[:, col['month']] = [d.month for d in dates]
+
+        # One-hot columns; unknown types leave every column at zero
+        dummy_cols = np.array([col.get(f"type_{c}", -1) for c in categories] + [-1])
+        rows = np.arange(n)
+        hot = dummy_cols[codes]
+        known = hot >= 0
+        X[rows[known], hot[known]] = 1.0
+
+        # Apply the saved scaler statistics directly
+        scaler = model_data['scaler']
+        numeric = [col[name] for name in model_data['numeric_features']]
+        X[:, numeric] = (X[:, numeric] - scaler.mean_) / scaler.scale_
+        return pd.DataFrame(X, columns=columns)
+
+registry = ModelRegistry()
+
+def predict_batch(recipients):
+    return registry.predict_batch(recipients)
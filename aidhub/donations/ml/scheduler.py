@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from ..models import RetrainJob
+
+logger = logging.getLogger('aidhub')
+
+_worker_lock = threading.Lock()
+_worker_thread = None
+
+def get_debounce_seconds():
+    return getattr(settings, 'RETRAIN_DEBOUNCE_SECONDS', 30)
+
+def pending_jobs():
+    return RetrainJob.objects.filter(status='pending')
+
+def stale_jobs():
+    """Jobs claimed longer than RETRAIN_JOB_TIMEOUT_SECONDS ago and not finished."""
+    cutoff = timezone.now() - timedelta(seconds=get_job_timeout_seconds())
+    return RetrainJob.objects.filter(status='running', started_at__lt=cutoff)
+
+def get_job_timeout_seconds():
+    return getattr(settings, 'RETRAIN_JOB_TIMEOUT_SECONDS', 3600)
+
+def requeue_stale_jobs():
+    """Put back 'running' jobs whose worker died before finishing them.
+
+    A job claimed more than RETRAIN_JOB_TIMEOUT_SECONDS ago is assumed
+    lost (e.g. a gunicorn worker recycled mid-fit) and becomes pending
+    again, to be coalesced into the next fit.
+    """
+    requeued = stale_jobs().update(status='pending', started_at=None)
+    if requeued:
+        logger.warning(f"Requeued {requeued} retrain job(s) running for over {get_job_timeout_seconds()}s")
+    return requeued
+
+def schedule_retrain():
+    """Mark the models as dirty; the fit itself happens in the background.
+
+    A burst of inserts collapses into one pending job: while a job is
+    pending, further calls only push its ``requested_at`` forward, so the
+    fit starts once inserts have been quiet for the debounce window.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        updated = pending_jobs().update(requested_at=now)
+        if not updated:
+            RetrainJob.objects.create(requested_at=now)
+
+    if getattr(settings, 'RETRAIN_IN_PROCESS', False):
+        _ensure_worker_thread()
+
+def run_pending_retrain(debounce=None, full=False):
+    """Claim every pending job that is past the debounce window and run one fit.
+
+    The urgency model is updated incrementally unless ``full`` is set (the
+    trainer still falls back to a full refit on schedule or on drift).
+    Returns the number of coalesced jobs, or 0 if there was nothing to do.
+    Safe to call from several processes: jobs are claimed with a
+    conditional update, so only one process runs each. Jobs whose worker
+    died are requeued first, see ``requeue_stale_jobs``.
+    """
+    if debounce is None:
+        debounce = get_debounce_seconds()
+    requeue_stale_jobs()
+    cutoff = timezone.now() - timedelta(seconds=debounce)
+
+    job_ids = list(
+        pending_jobs().filter(requested_at__lte=cutoff).values_list('id', flat=True)
+    )
+    if not job_ids:
+        return 0
+    claimed = RetrainJob.objects.filter(id__in=job_ids, status='pending') \
+                                .update(status='running', started_at=timezone.now())
+    if not claimed:
+        return 0
+    jobs = RetrainJob.objects.filter(id__in=job_ids, status='running')
+
+    # Imported here so the web request path never loads the training stack
+    from .trainer import train_model, train_trend_model, update_model
+
+    try:
+        logger.info(f"Retraining models for {claimed} coalesced job(s)")
+        train_model() if full else update_model()
+        train_trend_model()
+    except Exception as e:
+        logger.error(f"Background retrain failed: {e}")
+        jobs.update(status='failed', finished_at=timezone.now(), error=str(e))
+    else:
+        jobs.update(status='done', finished_at=timezone.now())
+    return claimed
+
+def has_pending_retrain():
+    return pending_jobs().exists()
+
+def _worker_loop():
+    global _worker_thread
+    try:
+        while True:
+            # Checked under the lock so a job scheduled while we exit
+            # always finds either this thread or none and starts a new one
+            with _worker_lock:
+                if not has_pending_retrain():
+                    _worker_thread = None
+                    return
+            time.sleep(get_debounce_seconds())
+            run_pending_retrain()
+    except Exception as e:
+        logger.error(f"Retrain worker error: {e}")
+        with _worker_lock:
+            _worker_thread = None
+    finally:
+        connection.close()
+
+def _ensure_worker_thread():
+    """Start the in-process drain thread unless one is already running."""
+    global _worker_thread
+    with _worker_lock:
+        if _worker_thread is not None:
+            return
+        _worker_thread = threading.Thread(target=_worker_loop, name='aidhub-retrain', daemon=True)
+        _worker_thread.start()
@@ -1,3 +1,4 @@
+import copy
 import joblib
 import pandas as pd
 import numpy as np
@@ -8,83 +9,164 @@ from sklearn.preprocessing import StandardScaler
 from sklearn.linear_model import LinearRegression
 import logging
 from django.conf import settings
-from django.db.models import Count
+from django.db.models import Count, Max
+from django.utils import timezone
+from datetime import timedelta
+from ..instrumentation import timed
+from .paths import MODEL_FILE, TREND_MODEL_FILE
+from .columnar import CategoryEncoder, date_features, fetch_columns
 from ..models import Recipient, DonatedRecipient, Donation
 import os
 
 logger = logging.getLogger('aidhub')
 
-MODEL_FILE = os.path.join(settings.BASE_DIR, 'donations/ml/models/donation_matcher.pkl')
-TREND_MODEL_FILE = os.path.join(settings.BASE_DIR, 'donations/ml/models/trend_predictor.pkl')
+def save_model_atomically(data, path):
+    """Write to a temp file and rename it over ``path``.
 
-def get_combined_dataset():
-    # Get current recipients
-    current_data = pd.DataFrame(
-        Recipient.objects.all().values(
-            'id', 'name', 'location', 'latitude', 'longitude', 
-            'donation_type', 'urgency', 'date_added'
-        )
-    )
-    
-    # Get historical data
-    historical_data = pd.DataFrame(
-        DonatedRecipient.objects.all().values(
-            'id', 'name', 'location', 'latitude', 'longitude',
-            'donation_type', 'urgency', 'transaction_date'
-        )
-    ).rename(columns={'transaction_date': 'date_added'})
-    
-    # Combine datasets
-    df = pd.concat([current_data, historical_data], ignore_index=True)
-    
-    if len(df) == 0:
+    Readers either see the previous model or the new one, never a
+    partially written file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(data, tmp_path)
+    os.replace(tmp_path, path)
+
+class TrainingRows:
+    """The rows behind a training set: their count, types and watermark."""
+
+    def __init__(self, donation_types, date_added, watermark):
+        self.donation_types = donation_types  # Every type seen, known to the model or not
+        self.date_added = date_added  # int64 microseconds since the epoch
+        self.watermark = watermark  # Highest ids covered, see training_rows()
+
+    def __len__(self):
+        return len(self.date_added)
+
+def training_rows(since=None):
+    """Open and claimed recipients to train on, and the watermark they reach.
+
+    The watermark holds the highest Recipient and DonatedRecipient ids at
+    the time of the call; rows above it are left for the next fit. With
+    ``since``, the previous fit's watermark, only rows past it are returned
+    (incremental updates), and claims of recipients that fit already saw
+    as open rows are left out so no recipient is trained twice. Ids, unlike
+    timestamps, are never reused for later rows; a row committed after a
+    higher id was read waits for the scheduled full refit.
+    """
+    watermark = {
+        'recipient': Recipient.objects.aggregate(last=Max('id'))['last'] or 0,
+        'donated': DonatedRecipient.objects.aggregate(last=Max('id'))['last'] or 0,
+    }
+    # Claimed recipients are already in the data as DonatedRecipient rows
+    recipients = Recipient.objects.filter(status='open', id__lte=watermark['recipient'])
+    donated = DonatedRecipient.objects.filter(id__lte=watermark['donated'])
+    if since is not None:
+        recipients = recipients.filter(id__gt=since['recipient'])
+        donated = donated.filter(id__gt=since['donated']).exclude(recipient_id__lte=since['recipient'])
+    return recipients, donated, watermark
+
+def get_combined_dataset(since=None, categories=None):
+    recipients, donated, watermark = training_rows(since)
+
+    # Only the feature columns, straight into typed arrays
+    encoder = CategoryEncoder()
+    current = fetch_columns(recipients, {
+        'latitude': 'float32', 'longitude': 'float32', 'donation_type': encoder,
+        'urgency': 'float64', 'date_added': 'datetime',
+    })
+    historical = fetch_columns(donated, {
+        'latitude': 'float32', 'longitude': 'float32', 'donation_type': encoder,
+        'urgency': 'float64', 'transaction_date': 'datetime',
+    })
+    historical['date_added'] = historical.pop('transaction_date')
+    data = {name: np.concatenate([current[name], historical[name]]) for name in current}
+
+    if len(data['date_added']) == 0:
         return None, None, None, []
-    
+
     # Print dataset statistics
-    logger.info(f"Training on {len(df)} total data points")
-    logger.info(f"Donation types: {df['donation_type'].value_counts().to_dict()}")
-    
-    # Features for prediction
-    X = pd.DataFrame()
-    X['latitude'] = df['latitude']
-    X['longitude'] = df['longitude']
-    
-    # Convert donation_type to categorical codes
-    donation_types = pd.Categorical(df['donation_type'])
-    X['donation_type_code'] = donation_types.codes
-    
-    # One-hot encode donation types
-    donation_dummies = pd.get_dummies(df['donation_type'], prefix='type')
-    X = pd.concat([X, donation_dummies], axis=1)
-    
-    # Add time-based features
-    df['date_added'] = pd.to_datetime(df['date_added'])
-    X['day_of_week'] = df['date_added'].dt.dayofweek
-    X['day_of_month'] = df['date_added'].dt.day
-    X['month'] = df['date_added'].dt.month
-    
+    counts = np.bincount(data['donation_type'], minlength=len(encoder.categories))
+    logger.info(f"Training on {len(data['date_added'])} total data points")
+    logger.info(f"Donation types: {dict(zip(encoder.categories, counts.tolist()))}")
+
+    # Categorical codes, sorted by name for a new model. An existing
+    # model's categories are kept fixed so the feature layout matches it;
+    # types it doesn't know get -1 and no one-hot column.
+    if categories is None:
+        categories = sorted(encoder.categories)
+    codes = encoder.recode(data['donation_type'], categories)
+    day_of_week, day_of_month, month = date_features(data['date_added'])
+
+    X = pd.DataFrame({
+        'latitude': data['latitude'],
+        'longitude': data['longitude'],
+        'donation_type_code': codes,
+        **{f"type_{category}": codes == i for i, category in enumerate(categories)},
+        'day_of_week': day_of_week,
+        'day_of_month': day_of_month,
+        'month': month,
+    })
+
     # Target variable
-    y = df['urgency']
-    
-    return df, X, y, donation_types.categories.tolist()
+    y = data['urgency']
 
+    rows = TrainingRows(encoder.categories, data['date_added'], watermark)
+    return rows, X, y, list(categories)
+
+def get_daily_counts():
+    """Rows per donation type and UTC day, over every recipient and donation.
+
+    Returns ``(categories, codes, days, counts)``: the type of each code,
+    then one entry per (type, day) pair with days counted from the epoch,
+    sorted by type code and day. None when there are fewer than three rows.
+    """
+    encoder = CategoryEncoder()
+    sources = (
+        (Recipient.objects.filter(status='open'), 'date_added'),
+        (DonatedRecipient.objects.all(), 'transaction_date'),
+        (Donation.objects.all(), 'donation_date'),
+    )
+    keys = []
+    for queryset, date_field in sources:
+        columns = fetch_columns(queryset, {'donation_type': encoder, date_field: 'datetime'})
+        # One int64 key per row: type code in the high bits, day in the low
+        days = columns[date_field] // 86_400_000_000
+        keys.append(columns['donation_type'].astype(np.int64) << 32 | days)
+    keys = np.concatenate(keys)
+
+    if len(keys) < 3:
+        return None
+    keys, counts = np.unique(keys, return_counts=True)
+    return encoder.categories, keys >> 32, keys & 0xFFFFFFFF, counts
+
+def load_model_data():
+    try:
+        return joblib.load(MODEL_FILE)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error loading saved model: {e}")
+        return None
+
+@timed('ml_training')
 def train_model():
     try:
-        df, X, y, donation_categories = get_combined_dataset()
+        rows, X, y, donation_categories = get_combined_dataset()
         
-        if df is None or len(df) < 1:
+        if rows is None or len(rows) < 1:
             logger.warning("No data available to train the model.")
             return None
         
-        logger.info(f"Training model with {len(df)} data points...")
+        logger.info(f"Training model with {len(rows)} data points...")
         
         # Choose model based on data size
-        if len(df) < 5:
-            model = KNeighborsRegressor(n_neighbors=min(3, len(df)))
-        elif len(df) < 15:
+        if len(rows) < 5:
+            model = KNeighborsRegressor(n_neighbors=min(3, len(rows)))
+        elif len(rows) < 15:
             model = LinearRegression()
         else:
-            model = RandomForestRegressor(n_estimators=100, random_state=42)
+            # warm_start lets update_model() add trees for new rows later
+            model = RandomForestRegressor(n_estimators=100, random_state=42, warm_start=True)
         
         # Scale features
         scaler = StandardScaler()
@@ -93,24 +175,33 @@ def train_model():
         X_scaled[numeric_features] = scaler.fit_transform(X[numeric_features])
         
         # Train model
-        if len(df) >= 5:
+        if len(rows) >= 5:
             X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2)
             model.fit(X_train, y_train)
             score = model.score(X_test, y_test)
+            baseline_mae = float(np.mean(np.abs(model.predict(X_test) - y_test)))
             logger.info(f"Model R² score: {score:.4f}")
         else:
             model.fit(X_scaled, y)
+            baseline_mae = None
         
         # Save model data
         model_data = {
             'model': model,
             'donation_categories': donation_categories,
             'scaler': scaler,
-            'numeric_features': numeric_features
+            'numeric_features': numeric_features,
+            'feature_columns': list(X.columns),
+            # Running statistics over every row seen since the last full fit;
+            # compared against the frozen scaler to detect drift
+            'running_scaler': copy.deepcopy(scaler),
+            'baseline_mae': baseline_mae,
+            'watermark': rows.watermark,
+            'full_fit_at': timezone.now(),
+            'n_samples': len(rows),
         }
         
-        os.makedirs(os.path.dirname(MODEL_FILE), exist_ok=True)
-        joblib.dump(model_data, MODEL_FILE)
+        save_model_atomically(model_data, MODEL_FILE)
         logger.info("Model saved successfully")
         
         return model_data
@@ -119,53 +210,134 @@ def train_model():
         logger.error(f"Error in train_model: {e}")
         return None
 
+# Saved by train_model() for update_model(); older model files lack them
+INCREMENTAL_KEYS = ('feature_columns', 'running_scaler', 'baseline_mae', 'watermark', 'full_fit_at')
+
+def _supports_incremental_update(model_data):
+    return (isinstance(model_data.get('model'), RandomForestRegressor)
+            and all(key in model_data for key in INCREMENTAL_KEYS))
+
+def _needs_full_refit(model_data, X_new, y_new, new_categories):
+    """Reason a full refit is required instead of an incremental update, or None."""
+    if new_categories:
+        return f"new donation types {sorted(new_categories)}"
+
+    interval = timedelta(hours=getattr(settings, 'RETRAIN_FULL_INTERVAL_HOURS', 24))
+    if timezone.now() - model_data['full_fit_at'] > interval:
+        return "scheduled full refit"
+
+    # Feature drift: running means moved away from the frozen scaler
+    scaler = model_data['scaler']
+    running = model_data['running_scaler']
+    shift = np.abs(running.mean_ - scaler.mean_) / scaler.scale_
+    if shift.max() > getattr(settings, 'RETRAIN_DRIFT_THRESHOLD', 0.5):
+        return f"feature drift ({shift.max():.2f} std)"
+
+    # Concept drift: the current model does badly on the new rows
+    baseline_mae = model_data['baseline_mae']
+    if baseline_mae:
+        mae = float(np.mean(np.abs(model_data['model'].predict(X_new) - y_new)))
+        if mae > baseline_mae * getattr(settings, 'RETRAIN_ERROR_DRIFT_FACTOR', 1.5):
+            return f"error drift (MAE {mae:.3f} vs {baseline_mae:.3f})"
+    return None
+
+@timed('ml_training')
+def update_model(min_rows=200, trees_per_update=10, max_trees=200):
+    """Fold rows added since the last fit into the saved model.
+
+    New rows get extra warm-started trees, as many as their share of all
+    rows seen earns them (at most ``trees_per_update``): every tree gets an
+    equal vote, so a tree must stand for as many rows as the existing ones
+    do on average. The oldest trees are dropped beyond ``max_trees`` so old
+    data slowly ages out.
+    Falls back to ``train_model()`` when there is no model yet or it
+    predates incremental updates (see INCREMENTAL_KEYS), on the
+    RETRAIN_FULL_INTERVAL_HOURS schedule, when new donation types appear or
+    when drift is detected. Fewer than ``min_rows`` new rows, or too few
+    for one tree, are left for the next update.
+    """
+    try:
+        model_data = load_model_data()
+        if model_data is None:
+            return train_model()
+        if not _supports_incremental_update(model_data):
+            logger.info("Full refit: model does not support incremental updates")
+            return train_model()
+
+        categories = model_data['donation_categories']
+        rows, X_new, y_new, _ = get_combined_dataset(since=model_data['watermark'], categories=categories)
+        if rows is None:
+            logger.info("No new rows since the last fit")
+            return model_data
+
+        model = model_data['model']
+        rows_per_tree = model_data['n_samples'] / len(model.estimators_)
+        new_trees = min(trees_per_update, int(len(rows) / rows_per_tree))
+        new_categories = set(rows.donation_types) - set(categories)
+        if not new_categories and (len(rows) < min_rows or new_trees < 1):
+            logger.info(f"Only {len(rows)} new rows ({rows_per_tree:.0f} per tree); "
+                        f"deferring incremental update")
+            return model_data
+
+        numeric_features = model_data['numeric_features']
+        if not new_categories:
+            X_new = X_new[model_data['feature_columns']]
+            model_data['running_scaler'].partial_fit(X_new[numeric_features])
+            X_new[numeric_features] = model_data['scaler'].transform(X_new[numeric_features])
+
+        reason = _needs_full_refit(model_data, X_new, y_new, new_categories)
+        if reason:
+            logger.info(f"Full refit: {reason}")
+            return train_model()
+
+        if len(model.estimators_) + new_trees > max_trees:
+            keep = max_trees - new_trees
+            model.estimators_ = model.estimators_[-keep:]
+        model.n_estimators = len(model.estimators_) + new_trees
+        model.fit(X_new, y_new)
+
+        model_data['watermark'] = rows.watermark
+        model_data['n_samples'] += len(rows)
+        save_model_atomically(model_data, MODEL_FILE)
+        logger.info(f"Incrementally updated model with {len(rows)} new rows "
+                    f"({len(model.estimators_)} trees)")
+        return model_data
+
+    except Exception as e:
+        logger.error(f"Error in update_model: {e}")
+        return None
+
+@timed('ml_training')
 def train_trend_model():
     try:
-        # Get all donation data
-        recipients = pd.DataFrame(
-            Recipient.objects.values('donation_type', 'date_added')
-        )
-        donated = pd.DataFrame(
-            DonatedRecipient.objects.values('donation_type', 'transaction_date')
-        ).rename(columns={'transaction_date': 'date_added'})
-        donations = pd.DataFrame(
-            Donation.objects.values('donation_type', 'donation_date')
-        ).rename(columns={'donation_date': 'date_added'})
-        
-        all_data = pd.concat([recipients, donated, donations], ignore_index=True)
-        
-        if len(all_data) < 3:
+        daily = get_daily_counts()
+        if daily is None:
             logger.warning("Not enough data to train trend model")
             return None
-            
-        # Process data
-        all_data['date_added'] = pd.to_datetime(all_data['date_added'])
-        all_data['date'] = all_data['date_added'].dt.date
-        grouped = all_data.groupby(['donation_type', 'date']).size().reset_index(name='count')
-        
+        categories, codes, days, counts = daily
+
         # Train models for each donation type
         trend_models = {}
-        for dtype in all_data['donation_type'].unique():
-            type_data = grouped[grouped['donation_type'] == dtype]
-            if len(type_data) < 3:
+        for code, dtype in enumerate(categories):
+            mask = codes == code
+            if mask.sum() < 3:
                 continue
-                
+
             # Create features
-            type_data['date'] = pd.to_datetime(type_data['date'])
+            day_of_week, day_of_month, month = date_features(days[mask] * 86_400_000_000)
             X = pd.DataFrame({
-                'day_of_week': type_data['date'].dt.dayofweek,
-                'day_of_month': type_data['date'].dt.day,
-                'month': type_data['date'].dt.month
+                'day_of_week': day_of_week,
+                'day_of_month': day_of_month,
+                'month': month,
             })
-            
+
             # Train model
             model = LinearRegression()
-            model.fit(X, type_data['count'])
+            model.fit(X, counts[mask])
             trend_models[dtype] = model
         
         # Save trend models
-        os.makedirs(os.path.dirname(TREND_MODEL_FILE), exist_ok=True)
-        joblib.dump(trend_models, TREND_MODEL_FILE)
+        save_model_atomically(trend_models, TREND_MODEL_FILE)
         logger.info(f"Trained trend models for {len(trend_models)} donation types")
         
         return trend_models
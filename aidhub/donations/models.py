@@ -2,6 +2,11 @@ from django.db import models
 from datetime import datetime
 
 class Recipient(models.Model):
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('claimed', 'Claimed'),
+    ]
+
     name = models.CharField(max_length=200)
     location = models.CharField(max_length=200)
     latitude = models.FloatField()
@@ -9,7 +14,21 @@ class Recipient(models.Model):
     donation_type = models.CharField(max_length=100)
     urgency = models.FloatField()
     contact = models.CharField(max_length=200)
-    date_added = models.DateTimeField(auto_now_add=True)
+    date_added = models.DateTimeField(auto_now_add=True, db_index=True)
+    geohash = models.CharField(max_length=12, blank=True, db_index=True)  # Kept in sync by signals
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Type filter in the recipient list; covers the per-type Avg(urgency)
+            models.Index(fields=['donation_type', 'urgency'], name='recipient_type_urgency_idx'),
+            # Open recipients of a type in a geohash range (recipient list).
+            # Status alone is too coarse: nearly every row is open
+            models.Index(fields=['status', 'donation_type', 'geohash'], name='recipient_open_type_geo_idx'),
+            # Open recipients by date (training and trend data)
+            models.Index(fields=['status', 'date_added'], name='recipient_open_date_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} - {self.donation_type}"
@@ -25,6 +44,12 @@ class Donation(models.Model):
     donation_date = models.DateTimeField(auto_now_add=True)
     donation_image = models.ImageField(upload_to='donation_images/', null=True, blank=True)
     classified_type = models.CharField(max_length=100, blank=True)
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, unique=True)  # Replays of a retried POST
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['donor_name'], name='donation_donor_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.donor_name} to {self.recipient.name}"
@@ -41,6 +66,125 @@ class DonatedRecipient(models.Model):
     donor_contact = models.CharField(max_length=200)
     pickup_location = models.CharField(max_length=200)
     transaction_date = models.DateTimeField(auto_now_add=True)
+    # The claimed recipient; null for rows from before claims kept recipients
+    recipient = models.ForeignKey(Recipient, null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the history, newest first
+            models.Index(fields=['transaction_date', 'id'], name='donated_txn_date_id_idx'),
+            # Covers the per-type Count/Avg(urgency) over completed donations
+            models.Index(fields=['donation_type', 'urgency'], name='donated_type_urgency_idx'),
+            models.Index(fields=['donor_name'], name='donated_donor_name_idx'),
+        ]
 
     def __str__(self):
         return f"{self.donor_name} to {self.name}"
+
+class GeocodeCache(models.Model):
+    address_key = models.CharField(max_length=255, unique=True)
+    query = models.CharField(max_length=255)
+    latitude = models.FloatField(null=True, blank=True)  # Null means "did not resolve"
+    longitude = models.FloatField(null=True, blank=True)
+    backend = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        if self.latitude is None:
+            return f"{self.query} (unresolved)"
+        return f"{self.query} ({self.latitude:.4f}, {self.longitude:.4f})"
+
+class RetrainJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    requested_at = models.DateTimeField()  # Bumped by every insert that lands while pending
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Retrain #{self.id} ({self.status})"
+
+# Aggregates below are maintained by donations.stats from model signals;
+# `manage.py rebuild_stats` recomputes them from scratch
+
+class DonationTypeStats(models.Model):
+    SOURCE_CHOICES = [
+        ('recipient', 'Open recipients'),
+        ('donated', 'Completed donations'),
+    ]
+
+    source = models.CharField(max_length=20, choices=SOURCE_CHOICES)
+    donation_type = models.CharField(max_length=100)
+    count = models.IntegerField(default=0)
+    urgency_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        unique_together = [('source', 'donation_type')]
+
+    def __str__(self):
+        return f"{self.source} {self.donation_type}: {self.count}"
+
+class DistinctDonor(models.Model):
+    donor_name = models.CharField(max_length=200, unique=True)
+    refcount = models.IntegerField(default=0)  # Donation + DonatedRecipient rows with this name
+
+    def __str__(self):
+        return f"{self.donor_name} ({self.refcount})"
+
+class DistinctLocation(models.Model):
+    location = models.CharField(max_length=200, unique=True)
+    refcount = models.IntegerField(default=0)  # Recipient + DonatedRecipient rows with this location
+
+    def __str__(self):
+        return f"{self.location} ({self.refcount})"
+
+class StatCounter(models.Model):
+    key = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
+
+# Opt-in profiling of selected views, see donations.profiling
+
+PROFILED_VIEW_CHOICES = [
+    ('recipients', '/api/recipients'),
+    ('add_recipient', '/api/add_recipient'),
+    ('donate', '/api/donate'),
+    ('classify_image', '/api/classify_image'),
+]
+
+class ProfilingRule(models.Model):
+    view = models.CharField(max_length=50, choices=PROFILED_VIEW_CHOICES, unique=True)
+    enabled = models.BooleanField(default=False)
+    sample_rate = models.PositiveIntegerField(default=100)  # Profile 1 in N requests
+    expires_at = models.DateTimeField(null=True, blank=True)  # Switches itself off after this
+
+    def __str__(self):
+        state = f"1 in {self.sample_rate}" if self.enabled else 'off'
+        return f"Profile {self.view} ({state})"
+
+class ProfileCapture(models.Model):
+    TRIGGER_CHOICES = [
+        ('header', 'Signed header'),
+        ('sampled', 'Sampled by rule'),
+    ]
+
+    view = models.CharField(max_length=50)
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    trigger = models.CharField(max_length=10, choices=TRIGGER_CHOICES)
+    file_name = models.CharField(max_length=255)  # Under PROFILE_DIR; removed with the row
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f} ms)"
@@ -0,0 +1,164 @@
+import cProfile
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from .models import ProfileCapture, ProfilingRule
+
+logger = logging.getLogger('aidhub')
+
+PROFILE_HEADER = 'X-Aidhub-Profile'
+CAPTURE_HEADER = 'X-Aidhub-Profile-Capture'
+_SIGNING_SALT = 'donations.profiling'
+
+def make_profile_token():
+    """A token for PROFILE_HEADER, valid for PROFILE_TOKEN_MAX_AGE seconds."""
+    return signing.TimestampSigner(salt=_SIGNING_SALT).sign('profile')
+
+def _valid_token(token):
+    try:
+        signing.TimestampSigner(salt=_SIGNING_SALT).unsign(token, max_age=settings.PROFILE_TOKEN_MAX_AGE)
+        return True
+    except signing.BadSignature as e:  # Also raised for expired tokens
+        logger.warning(f"Rejected profiling token: {e}")
+        return False
+
+# Enabled rules by view, re-read from the database every PROFILE_RULES_TTL
+# seconds so requests don't pay a query each
+_rules = {'expires': 0.0, 'by_view': {}}
+
+def _load_rules():
+    now = timezone.now()
+    try:
+        _rules['by_view'] = {
+            rule.view: rule for rule in ProfilingRule.objects.filter(enabled=True)
+            if rule.expires_at is None or rule.expires_at > now
+        }
+    except Exception as e:
+        logger.error(f"Error loading profiling rules: {e}")
+    _rules['expires'] = time.monotonic() + settings.PROFILE_RULES_TTL
+
+def _trigger(request, view):
+    """'header' or 'sampled' if this request should be profiled, else None."""
+    token = request.headers.get(PROFILE_HEADER)
+    if token and _valid_token(token):
+        return 'header'
+    rule = _rules['by_view'].get(view)
+    if rule and random.randrange(max(1, rule.sample_rate)) == 0:
+        return 'sampled'
+    return None
+
+def _prune():
+    # Ring buffer: keep the newest PROFILE_MAX_CAPTURES (the files go with
+    # the rows, see signals)
+    stale = ProfileCapture.objects.order_by('-created_at', '-id') \
+                                  .values_list('id', flat=True)[settings.PROFILE_MAX_CAPTURES:]
+    ProfileCapture.objects.filter(id__in=list(stale)).delete()
+
+def _save_capture(profiler, request, view, response, trigger, elapsed):
+    # A failed capture must not fail the request it profiled
+    try:
+        os.makedirs(settings.PROFILE_DIR, exist_ok=True)
+        file_name = f"{timezone.now():%Y%m%d-%H%M%S}-{view}-{uuid.uuid4().hex[:8]}.prof"
+        profiler.dump_stats(os.path.join(settings.PROFILE_DIR, file_name))
+        capture = ProfileCapture.objects.create(
+            view=view,
+            method=request.method,
+            path=request.get_full_path()[:500],
+            status_code=response.status_code,
+            duration_ms=elapsed * 1000,
+            trigger=trigger,
+            file_name=file_name,
+        )
+        _prune()
+    except Exception as e:
+        logger.error(f"Error saving profile capture: {e}")
+        return
+    response[CAPTURE_HEADER] = str(capture.id)
+    logger.info(f"Profiled {request.method} {request.path} ({trigger}) in {elapsed * 1000:.0f} ms: {file_name}")
+
+# One capture at a time per process: profiler hooks are process-wide on
+# Python 3.12+ (a second enable() raises), and an async capture already
+# takes in whatever else the event loop runs during it
+_capture_lock = threading.Lock()
+
+def _start_profiler():
+    """An enabled profiler, or None if another capture holds the hooks."""
+    if not _capture_lock.acquire(blocking=False):
+        logger.info("Skipping profile capture: another capture is running")
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError as e:  # Another profiling tool is active
+        _capture_lock.release()
+        logger.warning(f"Skipping profile capture: {e}")
+        return None
+    return profiler
+
+def _stop_profiler(profiler):
+    profiler.disable()
+    _capture_lock.release()
+
+def profiled(view):
+    """Run a view under cProfile when asked to, and keep the result.
+
+    A request is profiled when it carries a valid signed PROFILE_HEADER
+    token (see ``manage.py profile_token``), or, while the admin has a
+    ProfilingRule for ``view`` enabled, for 1 in ``sample_rate`` requests.
+    The .prof file goes to PROFILE_DIR, of which only the newest
+    PROFILE_MAX_CAPTURES are kept, and its ProfileCapture id is returned
+    in CAPTURE_HEADER. For async views the profile covers the event loop
+    thread, so work handed to sync_to_async shows up as the time awaited,
+    and other requests the loop serves meanwhile are in it too. Only one
+    request per process is profiled at a time; others arriving during a
+    capture run unprofiled.
+    """
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            @wraps(view_func)
+            async def async_wrapper(request, *args, **kwargs):
+                if time.monotonic() >= _rules['expires']:
+                    await sync_to_async(_load_rules)()
+                trigger = _trigger(request, view)
+                profiler = _start_profiler() if trigger else None
+                if profiler is None:
+                    return await view_func(request, *args, **kwargs)
+
+                started = time.perf_counter()
+                try:
+                    response = await view_func(request, *args, **kwargs)
+                finally:
+                    _stop_profiler(profiler)
+                await sync_to_async(_save_capture)(profiler, request, view, response, trigger,
+                                                   time.perf_counter() - started)
+                return response
+
+            return async_wrapper
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if time.monotonic() >= _rules['expires']:
+                _load_rules()
+            trigger = _trigger(request, view)
+            profiler = _start_profiler() if trigger else None
+            if profiler is None:
+                return view_func(request, *args, **kwargs)
+
+            started = time.perf_counter()
+            try:
+                response = view_func(request, *args, **kwargs)
+            finally:
+                _stop_profiler(profiler)
+            _save_capture(profiler, request, view, response, trigger, time.perf_counter() - started)
+            return response
+
+        return wrapper
+    return decorator
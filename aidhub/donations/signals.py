@@ -0,0 +1,66 @@
+import logging
+import os
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from .models import Recipient, Donation, DonatedRecipient, ProfileCapture
+from .stats import TRACKED_FIELDS, record_change, tracked_values
+from .utils.geo import encode_geohash
+from .utils.response_cache import invalidate_api_cache
+
+logger = logging.getLogger('aidhub')
+
+@receiver(pre_save, sender=Recipient)
+def update_recipient_geohash(sender, instance, **kwargs):
+    # Keep the spatial index column in sync with the coordinates
+    if instance.latitude is not None and instance.longitude is not None:
+        instance.geohash = encode_geohash(instance.latitude, instance.longitude)
+
+@receiver(pre_save, sender=Recipient)
+@receiver(pre_save, sender=Donation)
+@receiver(pre_save, sender=DonatedRecipient)
+def remember_stats_values(sender, instance, raw=False, **kwargs):
+    # Edits need the stored values so the aggregates can move the row's
+    # contribution; inserts have nothing stored yet
+    instance._stats_old_values = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    instance._stats_old_values = sender.objects.filter(pk=instance.pk) \
+                                               .values(*TRACKED_FIELDS[sender]).first()
+
+@receiver(post_save, sender=Recipient)
+@receiver(post_save, sender=Donation)
+@receiver(post_save, sender=DonatedRecipient)
+def update_stats_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old_values = None if created else getattr(instance, '_stats_old_values', None)
+    record_change(sender, old_values, tracked_values(instance))
+
+@receiver(post_delete, sender=Recipient)
+@receiver(post_delete, sender=Donation)
+@receiver(post_delete, sender=DonatedRecipient)
+def update_stats_on_delete(sender, instance, **kwargs):
+    record_change(sender, tracked_values(instance), None)
+
+@receiver(post_save, sender=Recipient)
+@receiver(post_save, sender=Donation)
+@receiver(post_save, sender=DonatedRecipient)
+@receiver(post_delete, sender=Recipient)
+@receiver(post_delete, sender=Donation)
+@receiver(post_delete, sender=DonatedRecipient)
+def invalidate_cached_responses(sender, **kwargs):
+    # After commit, so a request can't re-cache the pre-write data under
+    # the new generation
+    transaction.on_commit(invalidate_api_cache)
+
+@receiver(post_delete, sender=ProfileCapture)
+def delete_profile_file(sender, instance, **kwargs):
+    # Captures are pruned as a ring buffer; their files go with them
+    try:
+        os.remove(os.path.join(settings.PROFILE_DIR, instance.file_name))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.error(f"Error deleting profile capture file: {e}")
@@ -0,0 +1,178 @@
+import logging
+from collections import Counter, defaultdict
+from django.apps import apps as global_apps
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from .models import (
+    Recipient, Donation, DonatedRecipient,
+    DonationTypeStats, DistinctDonor, DistinctLocation, StatCounter,
+)
+
+logger = logging.getLogger('aidhub')
+
+TOTAL_DONATIONS = 'total_donations'
+UNIQUE_DONORS = 'unique_donors'
+COMMUNITIES_SERVED = 'communities_served'
+
+# Fields each model contributes to the aggregates; edits to any of these
+# move the row's contribution from the old values to the new ones
+TRACKED_FIELDS = {
+    Recipient: ('donation_type', 'urgency', 'location', 'status'),
+    DonatedRecipient: ('donation_type', 'urgency', 'location', 'donor_name'),
+    Donation: ('donor_name',),
+}
+
+def _bump(model, lookup, **deltas):
+    """Add ``deltas`` to the row matching ``lookup``, creating it if needed."""
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    if not model.objects.filter(**lookup).update(**updates):
+        model.objects.get_or_create(**lookup)
+        model.objects.filter(**lookup).update(**updates)
+
+def _bump_counter(key, delta):
+    _bump(StatCounter, {'key': key}, value=delta)
+
+def _adjust_distinct(model, field, value, delta, counter_key):
+    # The counter moves only when a value appears (refcount leaves 0) or
+    # disappears (refcount returns to 0), so it never has to be recomputed
+    _bump(model, {field: value}, refcount=delta)
+    row = model.objects.select_for_update().get(**{field: value})
+    if delta > 0 and row.refcount == delta:
+        _bump_counter(counter_key, 1)
+    elif row.refcount <= 0:
+        row.delete()
+        _bump_counter(counter_key, -1)
+
+def _apply(model, rows, sign):
+    """Add (sign=1) or remove (sign=-1) the contribution of ``rows``.
+
+    Rows are aggregated first, so each distinct type, donor and location
+    costs one update however many rows share it.
+    """
+    if model is Recipient:
+        # A claimed recipient is counted through its DonatedRecipient row
+        rows = [row for row in rows if row['status'] == 'open']
+    if not rows:
+        return
+
+    if model in (Recipient, DonatedRecipient):
+        source = 'recipient' if model is Recipient else 'donated'
+        counts, urgency_sums = Counter(), defaultdict(float)
+        for row in rows:
+            counts[row['donation_type']] += 1
+            urgency_sums[row['donation_type']] += row['urgency']
+        for donation_type, n in counts.items():
+            _bump(DonationTypeStats, {'source': source, 'donation_type': donation_type},
+                  count=sign * n, urgency_sum=sign * urgency_sums[donation_type])
+        for location, n in Counter(row['location'] for row in rows).items():
+            _adjust_distinct(DistinctLocation, 'location', location, sign * n, COMMUNITIES_SERVED)
+
+    if model in (DonatedRecipient, Donation):
+        for donor_name, n in Counter(row['donor_name'] for row in rows).items():
+            _adjust_distinct(DistinctDonor, 'donor_name', donor_name, sign * n, UNIQUE_DONORS)
+
+    if model is DonatedRecipient:
+        # Every claim writes a Donation and a DonatedRecipient; the total
+        # counts the DonatedRecipient so a claim is counted once
+        _bump_counter(TOTAL_DONATIONS, sign * len(rows))
+
+def tracked_values(instance):
+    return {field: getattr(instance, field) for field in TRACKED_FIELDS[type(instance)]}
+
+def record_change(model, old_values=None, new_values=None):
+    """Move one row's contribution from ``old_values`` to ``new_values``.
+
+    Either side may be None (insert or delete). Runs in its own atomic
+    block, or as part of the caller's transaction.
+    """
+    if old_values == new_values:
+        return
+    with transaction.atomic():
+        if old_values is not None:
+            _apply(model, [old_values], -1)
+        if new_values is not None:
+            _apply(model, [new_values], 1)
+
+def record_bulk_insert(model, instances):
+    """record_change for rows written with bulk_create, which sends no signals."""
+    with transaction.atomic():
+        _apply(model, [tracked_values(instance) for instance in instances], 1)
+
+def type_stats_rows(source, limit=None):
+    stats = DonationTypeStats.objects.filter(source=source, count__gt=0) \
+                                     .order_by('-count', 'donation_type')
+    return stats[:limit] if limit else stats
+
+def get_type_stats(source, limit=None):
+    """Per-type ``count`` and ``avg_urgency`` for one source, most common first."""
+    stats = type_stats_rows(source, limit)
+    return [
+        {
+            'donation_type': stat.donation_type,
+            'count': stat.count,
+            'avg_urgency': stat.urgency_sum / stat.count,
+        }
+        for stat in stats
+    ]
+
+def get_summary():
+    values = dict(StatCounter.objects.values_list('key', 'value'))
+    return {key: values.get(key, 0) for key in (TOTAL_DONATIONS, UNIQUE_DONORS, COMMUNITIES_SERVED)}
+
+def type_totals(queryset):
+    """Rows and urgency sum per donation type of ``queryset``."""
+    return queryset.values('donation_type') \
+                   .annotate(count=Count('id'), urgency_sum=Sum('urgency')) \
+                   .order_by()
+
+def grouped_counts(queryset, field):
+    """(value, rows) per distinct ``field`` of ``queryset``."""
+    return queryset.values_list(field).annotate(n=Count('id')).order_by()
+
+def rebuild_stats(apps=global_apps):
+    """Recompute every aggregate table from the source tables.
+
+    ``apps`` lets migrations run this against historical models.
+    """
+    def get(name):
+        return apps.get_model('donations', name)
+
+    recipient_model = get('Recipient')
+    recipients = recipient_model.objects.all()
+    if any(field.name == 'status' for field in recipient_model._meta.fields):
+        recipients = recipients.filter(status='open')  # Absent in migrations before claims existed
+    donations = get('Donation').objects.all()
+    donated = get('DonatedRecipient').objects.all()
+    TypeStats, Donors, Locations, Counters = (
+        get('DonationTypeStats'), get('DistinctDonor'), get('DistinctLocation'), get('StatCounter')
+    )
+
+    def grouped(queryset, field):
+        return Counter(dict(grouped_counts(queryset, field)))
+
+    with transaction.atomic():
+        for model in (TypeStats, Donors, Locations, Counters):
+            model.objects.all().delete()
+
+        type_stats = []
+        for source, queryset in (('recipient', recipients), ('donated', donated)):
+            type_stats += [TypeStats(source=source, **row) for row in type_totals(queryset)]
+        TypeStats.objects.bulk_create(type_stats, batch_size=500)
+
+        donors = grouped(donations, 'donor_name') + grouped(donated, 'donor_name')
+        Donors.objects.bulk_create(
+            [Donors(donor_name=name, refcount=n) for name, n in donors.items()], batch_size=500
+        )
+        locations = grouped(recipients, 'location') + grouped(donated, 'location')
+        Locations.objects.bulk_create(
+            [Locations(location=location, refcount=n) for location, n in locations.items()], batch_size=500
+        )
+
+        Counters.objects.bulk_create([
+            Counters(key=TOTAL_DONATIONS, value=donated.count()),
+            Counters(key=UNIQUE_DONORS, value=len(donors)),
+            Counters(key=COMMUNITIES_SERVED, value=len(locations)),
+        ])
+
+    logger.info(f"Rebuilt donation stats: {len(type_stats)} type rows, "
+                f"{len(donors)} donors, {len(locations)} locations")
@@ -0,0 +1,232 @@
+import logging
+import time
+from datetime import timezone as dt_timezone
+import numpy as np
+from django.conf import settings
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from .models import Recipient, Donation, DonatedRecipient
+from .stats import rebuild_stats
+from .utils.geo import KM_PER_DEGREE, encode_geohash_array
+from .utils.response_cache import invalidate_api_cache
+
+logger = logging.getLogger('aidhub')
+
+# name, latitude, longitude, population in millions, spread of barangays in km
+CITIES = [
+    ('Quezon City', 14.6760, 121.0437, 2.96, 6.0),
+    ('Manila', 14.5995, 120.9842, 1.85, 3.0),
+    ('Davao City', 7.1907, 125.4553, 1.78, 10.0),
+    ('Caloocan', 14.6507, 120.9676, 1.66, 4.0),
+    ('Zamboanga City', 6.9214, 122.0790, 0.98, 8.0),
+    ('Cebu City', 10.3157, 123.8854, 0.96, 5.0),
+    ('Taguig', 14.5176, 121.0509, 0.89, 3.0),
+    ('Antipolo', 14.5864, 121.1761, 0.89, 5.0),
+    ('Pasig', 14.5764, 121.0851, 0.80, 3.0),
+    ('Cagayan de Oro', 8.4542, 124.6319, 0.73, 6.0),
+    ('Bacolod', 10.6765, 122.9509, 0.60, 5.0),
+    ('Iloilo City', 10.7202, 122.5621, 0.46, 4.0),
+    ('Baguio', 16.4023, 120.5960, 0.37, 3.0),
+]
+BARANGAYS_PER_CITY = 60
+
+# donation type: (share of requests, typical urgency)
+DONATION_TYPES = {
+    'food': (0.30, 3.8),
+    'clothes': (0.18, 3.0),
+    'medicine': (0.14, 4.2),
+    'hygiene': (0.10, 3.3),
+    'school_supplies': (0.08, 2.6),
+    'books': (0.07, 2.1),
+    'electronics': (0.05, 2.0),
+    'furniture': (0.04, 2.3),
+    'toys': (0.04, 1.9),
+}
+
+# Relative activity per hour of the day (Manila time): quiet nights,
+# a morning peak and a longer evening one
+HOURLY_ACTIVITY = np.array([
+    1, 1, 1, 1, 1, 2, 4, 7, 9, 10, 9, 8, 8, 8, 7, 7, 8, 10, 11, 11, 9, 6, 3, 2,
+], dtype=np.float64)
+UTC_OFFSET_HOURS = 8
+
+class SyntheticGeocoder:
+    """Geocoder backend that resolves the cities above instantly.
+
+    For benchmarks and load tests: run the server with
+    GEOCODER_BACKEND=donations.synthetic.SyntheticGeocoder so no request
+    waits on the network.
+    """
+    name = 'synthetic'
+
+    def geocode(self, query):
+        query = query.lower()
+        for city, latitude, longitude, *_ in CITIES:
+            if city.lower() in query:
+                return latitude, longitude
+        return None
+
+def truncate_data():
+    """Empty the recipient, donation and history tables.
+
+    Uses the backend's flush SQL (TRUNCATE, or DELETE without a WHERE
+    clause on SQLite) instead of ORM deletes, which load every row to
+    cascade and send signals. The aggregate tables are not touched; call
+    ``rebuild_stats`` afterwards.
+    """
+    tables = [model._meta.db_table for model in (Donation, DonatedRecipient, Recipient)]
+    sql_list = connection.ops.sql_flush(no_style(), tables, reset_sequences=True)
+    connection.ops.execute_sql_flush(sql_list)
+
+def _timestamps(rng, n, days, now):
+    """Epoch seconds over the last ``days`` days, skewed towards recent
+    days and busy hours of the day."""
+    day_offsets = np.minimum(np.floor(rng.exponential(days / 3, n)), days - 1)
+    hours = rng.choice(24, n, p=HOURLY_ACTIVITY / HOURLY_ACTIVITY.sum())
+    local_midnight = (now + UTC_OFFSET_HOURS * 3600) // 86400 * 86400 - UTC_OFFSET_HOURS * 3600
+    seconds = (local_midnight - day_offsets * 86400 + hours * 3600 + rng.uniform(0, 3600, n))
+    return np.minimum(seconds, now - rng.uniform(0, 60, n))
+
+def _db_datetimes(seconds):
+    values = np.asarray(seconds * 1e6, dtype=np.int64).astype('datetime64[us]').astype(object)
+    if settings.USE_TZ:
+        values = [value.replace(tzinfo=dt_timezone.utc) for value in values]
+    adapt = connection.ops.adapt_datetimefield_value
+    return [adapt(value) for value in values]
+
+def _insert(model, columns, batch_size):
+    """INSERT rows given as {field name: list of values} with executemany.
+
+    bulk_create would build a model instance per row and overwrite the
+    generated auto_now_add timestamps with the current time.
+    """
+    fields = [model._meta.get_field(name) for name in columns]
+    quote = connection.ops.quote_name
+    sql = (f"INSERT INTO {quote(model._meta.db_table)} "
+           f"({', '.join(quote(field.column) for field in fields)}) "
+           f"VALUES ({', '.join(['%s'] * len(fields))})")
+    rows = list(zip(*columns.values()))
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany(sql, rows[start:start + batch_size])
+    return len(rows)
+
+def _phone_numbers(rng, n):
+    return [f"09{number:09d}" for number in rng.integers(0, 10 ** 9, n).tolist()]
+
+def seed_synthetic(recipients=10000, donations=None, seed=0, days=365, batch_size=50000):
+    """Insert ``recipients`` synthetic recipients, ``donations`` of which are
+    claimed, each with the Donation and DonatedRecipient rows a claim writes.
+
+    Recipients cluster around barangays of large Philippine cities (by
+    population), types follow a skewed mix with per-type urgency, and
+    timestamps favour recent days and busy hours. The same ``seed`` gives
+    the same data. Rows are added to whatever is already there; the
+    aggregate tables are rebuilt and the API cache invalidated at the end.
+    Returns the number of rows written per table.
+    """
+    if donations is None:
+        donations = recipients // 2
+    donations = min(donations, recipients)
+    rng = np.random.default_rng(seed)
+    now = time.time()
+    started = time.perf_counter()
+
+    # Recipients: city by population, then a barangay of it, then a few
+    # hundred metres around that barangay's centre
+    names, city_lats, city_lons, populations, spreads = zip(*CITIES)
+    city = rng.choice(len(CITIES), recipients, p=np.array(populations) / sum(populations))
+    barangay = rng.integers(0, BARANGAYS_PER_CITY, recipients)
+    centre_offsets = np.random.default_rng(seed + 1).normal(size=(len(CITIES), BARANGAYS_PER_CITY, 2))
+    offset_km = centre_offsets[city, barangay] * np.array(spreads)[city, None] \
+        + rng.normal(0, 0.3, (recipients, 2))
+    latitudes = np.array(city_lats)[city] + offset_km[:, 0] / KM_PER_DEGREE
+    longitudes = np.array(city_lons)[city] \
+        + offset_km[:, 1] / (KM_PER_DEGREE * np.cos(np.radians(np.array(city_lats)[city])))
+    locations = [f"Barangay {b + 1}, {names[c]}" for c, b in zip(city.tolist(), barangay.tolist())]
+
+    types, (shares, typical_urgency) = list(DONATION_TYPES), zip(*DONATION_TYPES.values())
+    type_index = rng.choice(len(types), recipients, p=np.array(shares) / sum(shares))
+    donation_types = np.array(types)[type_index]
+    urgencies = np.round(np.clip(np.array(typical_urgency)[type_index] + rng.normal(0, 0.6, recipients),
+                                 1.0, 5.0), 2)
+    date_added = _timestamps(rng, recipients, days, now)
+    contacts = _phone_numbers(rng, recipients)
+    recipient_names = [f"Household {i}" for i in rng.integers(1, 10 ** 6, recipients).tolist()]
+
+    # Claims come a few days after the request
+    claimed_index = np.sort(rng.choice(recipients, donations, replace=False))
+    claimed_seconds = np.minimum(date_added[claimed_index] + rng.exponential(3 * 86400, donations), now)
+    claimed_dates = _db_datetimes(claimed_seconds)
+    status = np.full(recipients, 'open', dtype=object)
+    status[claimed_index] = 'claimed'
+    claimed_at = np.full(recipients, None, dtype=object)
+    claimed_at[claimed_index] = claimed_dates
+
+    # Donors: a long tail, with a few frequent donors
+    donor_count = max(1, donations // 4)
+    donor_weights = 1.0 / np.arange(1, donor_count + 1) ** 0.8
+    donor = rng.choice(donor_count, donations, p=donor_weights / donor_weights.sum())
+    donor_names = [f"Donor {i + 1}" for i in donor.tolist()]
+    donor_contacts = np.array(_phone_numbers(rng, donor_count), dtype=object)[donor].tolist()
+    pickup_locations = [locations[i] for i in rng.integers(0, recipients, donations).tolist()]
+
+    written = {}
+    with transaction.atomic():
+        last_id = Recipient.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        written['recipients'] = _insert(Recipient, {
+            'name': recipient_names,
+            'location': locations,
+            'latitude': latitudes.tolist(),
+            'longitude': longitudes.tolist(),
+            'donation_type': donation_types.tolist(),
+            'urgency': urgencies.tolist(),
+            'contact': contacts,
+            'date_added': _db_datetimes(date_added),
+            'geohash': encode_geohash_array(latitudes, longitudes).tolist(),
+            'status': status.tolist(),
+            'claimed_at': claimed_at.tolist(),
+        }, batch_size)
+
+        # Ids come back in insertion order, which is the order generated above
+        recipient_ids = np.fromiter(
+            Recipient.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True),
+            dtype=np.int64, count=recipients,
+        )
+        claimed_types = donation_types[claimed_index].tolist()
+        written['donations'] = _insert(Donation, {
+            'donor_name': donor_names,
+            'donor_contact': donor_contacts,
+            'donation_type': claimed_types,
+            'suggested_type': [''] * donations,
+            'text_pattern_match': [''] * donations,
+            'pickup_location': pickup_locations,
+            'recipient': recipient_ids[claimed_index].tolist(),
+            'donation_date': claimed_dates,
+            'donation_image': [None] * donations,
+            'classified_type': [''] * donations,
+            # The site sends a key with every donation; by recipient id, so
+            # seeding again with the same seed adds no duplicates
+            'idempotency_key': [f"synthetic-{i}" for i in recipient_ids[claimed_index].tolist()],
+        }, batch_size)
+        written['donated_recipients'] = _insert(DonatedRecipient, {
+            'name': [recipient_names[i] for i in claimed_index.tolist()],
+            'location': [locations[i] for i in claimed_index.tolist()],
+            'latitude': latitudes[claimed_index].tolist(),
+            'longitude': longitudes[claimed_index].tolist(),
+            'donation_type': claimed_types,
+            'urgency': urgencies[claimed_index].tolist(),
+            'donor_name': donor_names,
+            'recipient_contact': [contacts[i] for i in claimed_index.tolist()],
+            'donor_contact': donor_contacts,
+            'pickup_location': pickup_locations,
+            'transaction_date': claimed_dates,
+            'recipient': recipient_ids[claimed_index].tolist(),
+        }, batch_size)
+
+        rebuild_stats()
+        transaction.on_commit(invalidate_api_cache)
+
+    logger.info(f"Seeded {sum(written.values())} synthetic rows in "
+                f"{time.perf_counter() - started:.1f}s (seed {seed})")
+    return written
@@ -2,7 +2,7 @@ from django.urls import path
 from .views import (
     IndexView, TrendingView, RecipientListView,
     DonationView, AddRecipientView, HistoryView, SummaryStatsView,
-    ClassifyImageView
+    ClassifyImageView, ImportRecipientsView, MetricsView
 )
 from . import views
 
@@ -17,11 +17,15 @@ urlpatterns = [
     path('api/donate/', DonationView.as_view(), name='donate-slash'),
     path('api/add_recipient', AddRecipientView.as_view(), name='add_recipient'),
     path('api/add_recipient/', AddRecipientView.as_view(), name='add_recipient-slash'),
+    path('api/import_recipients', ImportRecipientsView.as_view(), name='import_recipients'),
+    path('api/import_recipients/', ImportRecipientsView.as_view(), name='import_recipients-slash'),
     path('api/history', HistoryView.as_view(), name='history'),
     path('api/history/', HistoryView.as_view(), name='history-slash'),
     path('api/summary_stats', SummaryStatsView.as_view(), name='summary_stats'),
     path('api/summary_stats/', SummaryStatsView.as_view(), name='summary_stats-slash'),
     path('api/classify_image', ClassifyImageView.as_view(), name='classify_image'),
     path('api/classify_image/', ClassifyImageView.as_view(), name='classify_image-slash'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('api/detect_donation_type/', views.detect_donation_type, name='detect_donation_type'),
+    path('api/detect_donation_type/batch/', views.detect_donation_type_batch, name='detect_donation_type_batch'),
 ]
@@ -0,0 +1,125 @@
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = 111.32
+
+GEOHASH_PRECISION = 9  # ~5m cells, more than enough for prefix searches
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    ch = 0
+    even = True  # Geohash interleaves bits starting with longitude
+    while len(chars) < precision:
+        rng, value = (lon_range, longitude) if even else (lat_range, latitude)
+        mid = (rng[0] + rng[1]) / 2
+        if value >= mid:
+            ch = (ch << 1) | 1
+            rng[0] = mid
+        else:
+            ch <<= 1
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(_BASE32[ch])
+            bits = 0
+            ch = 0
+    return ''.join(chars)
+
+
+def encode_geohash_array(latitudes, longitudes, precision=GEOHASH_PRECISION):
+    """encode_geohash for arrays of points; returns an array of strings."""
+    lat_bits = (5 * precision) // 2
+    lon_bits = 5 * precision - lat_bits
+    lat = np.asarray(latitudes, dtype=np.float64)
+    lon = np.asarray(longitudes, dtype=np.float64)
+    # Cell index along each axis; its bits are the bisection choices
+    lat_cells = np.clip(((lat + 90.0) / 180.0 * 2 ** lat_bits).astype(np.int64), 0, 2 ** lat_bits - 1)
+    lon_cells = np.clip(((lon + 180.0) / 360.0 * 2 ** lon_bits).astype(np.int64), 0, 2 ** lon_bits - 1)
+
+    code = np.zeros(lat.shape, dtype=np.int64)
+    for i in range(5 * precision):
+        cells, width = (lon_cells, lon_bits) if i % 2 == 0 else (lat_cells, lat_bits)
+        code = (code << 1) | ((cells >> (width - 1 - i // 2)) & 1)
+
+    alphabet = np.array(list(_BASE32))
+    chars = np.empty(lat.shape + (precision,), dtype='<U1')
+    for j in range(precision):
+        chars[..., j] = alphabet[(code >> (5 * (precision - 1 - j))) & 31]
+    return chars.view(f'<U{precision}')[..., 0]
+
+
+def geohash_cell_size(precision):
+    """(height, width) of a geohash cell in degrees."""
+    lon_bits = math.ceil(5 * precision / 2)
+    lat_bits = (5 * precision) // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_prefixes(latitude, longitude, radius_km):
+    """Geohash prefixes whose cells cover every point within ``radius_km``.
+
+    Picks the finest precision whose cells are at least ``radius_km`` on
+    each side and returns the cell containing the point plus its eight
+    neighbours. Returns an empty set when the radius is too large for
+    prefix filtering to help.
+    """
+    lon_scale = max(math.cos(math.radians(latitude)), 0.01)
+    precision = 0
+    for p in range(1, GEOHASH_PRECISION + 1):
+        height, width = geohash_cell_size(p)
+        if height * KM_PER_DEGREE < radius_km or width * KM_PER_DEGREE * lon_scale < radius_km:
+            break
+        precision = p
+    if precision == 0:
+        return set()
+
+    height, width = geohash_cell_size(precision)
+    prefixes = set()
+    for dlat in (-height, 0, height):
+        lat = latitude + dlat
+        if not -90 <= lat <= 90:
+            continue
+        for dlon in (-width, 0, width):
+            lon = (longitude + dlon + 180) % 360 - 180
+            prefixes.add(encode_geohash(lat, lon, precision))
+    return prefixes
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Great-circle distance in km from one point to arrays of points."""
+    lat1 = np.radians(latitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=np.float64))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(longitudes, dtype=np.float64) - longitude)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def rank_nearby(latitude, longitude, latitudes, longitudes, urgencies,
+                radius_km=None, limit=None):
+    """Rank candidate points by the recipient list score.
+
+    The score is ``distance * 0.3 - urgency * 0.7`` (lower is better).
+    Returns ``(indices, distances)`` for the best ``limit`` candidates
+    within ``radius_km``, best first.
+    """
+    distances = haversine_km(latitude, longitude, latitudes, longitudes)
+    indices = np.arange(len(distances))
+    if radius_km is not None:
+        indices = indices[distances <= radius_km]
+
+    scores = distances[indices] * 0.3 - np.asarray(urgencies, dtype=np.float64)[indices] * 0.7
+    if limit is not None and limit < len(indices):
+        top = np.argpartition(scores, limit - 1)[:limit]
+        indices, scores = indices[top], scores[top]
+    order = np.argsort(scores, kind='stable')
+    indices = indices[order]
+    return indices, distances[indices]
@@ -0,0 +1,401 @@
+import asyncio
+import csv
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from geopy.exc import GeocoderQueryError, GeocoderServiceError
+from ..instrumentation import timed
+
+logger = logging.getLogger('aidhub')
+
+# Sentinel returned by the in-process cache when a key is not present
+_MISSING = object()
+
+
+class GeocodingUnavailable(Exception):
+    """The backend could not answer right now (timeout, rate limit, outage).
+
+    Unlike an address that simply does not resolve, this is never cached.
+    """
+
+
+def normalize_address(address):
+    """Canonical cache key for a free-text address.
+
+    Case, accents, repeated whitespace and stray punctuation do not change
+    the key, so "Quezon City,  Metro Manila." and "quezon city, metro manila"
+    share one cache entry.
+    """
+    text = unicodedata.normalize('NFKD', address or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    text = re.sub(r'[^\w\s,]', ' ', text)
+    parts = [' '.join(part.split()) for part in text.split(',')]
+    return ', '.join(part for part in parts if part)[:255]
+
+
+class LRUCache:
+    """Small thread-safe LRU mapping with per-entry expiry."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class NominatimBackend:
+    """OpenStreetMap Nominatim over the network, one shared client."""
+
+    name = 'nominatim'
+
+    def __init__(self, user_agent='donation_ai', timeout=5):
+        from geopy.geocoders import Nominatim
+        self.geolocator = Nominatim(user_agent=user_agent, timeout=timeout)
+
+    def geocode(self, query):
+        try:
+            loc = self.geolocator.geocode(query)
+        except GeocoderQueryError:
+            return None
+        except GeocoderServiceError as e:
+            raise GeocodingUnavailable(str(e)) from e
+        if loc:
+            return loc.latitude, loc.longitude
+        return None
+
+
+class GazetteerBackend:
+    """Offline lookups against a local CSV or SQLite gazetteer.
+
+    CSV files need ``name``, ``latitude`` and ``longitude`` columns; SQLite
+    files need a ``gazetteer`` table with the same columns. Names are
+    normalized the same way as cache keys. If the full address is not found,
+    leading components are dropped one at a time, so "Tondo, Manila" falls
+    back to "Manila".
+    """
+
+    name = 'gazetteer'
+
+    def __init__(self, path):
+        if not path:
+            raise ValueError("GEOCODER_GAZETTEER_PATH is not set")
+        self.path = path
+        self.places = self._load(path)
+        logger.info(f"Loaded {len(self.places)} gazetteer entries from {path}")
+
+    @staticmethod
+    def _load(path):
+        if os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3'):
+            with sqlite3.connect(path) as conn:
+                rows = conn.execute('SELECT name, latitude, longitude FROM gazetteer').fetchall()
+        else:
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = [(r['name'], r['latitude'], r['longitude']) for r in csv.DictReader(f)]
+        return {normalize_address(name): (float(lat), float(lon)) for name, lat, lon in rows}
+
+    def geocode(self, query):
+        parts = normalize_address(query).split(', ')
+        for i in range(len(parts)):
+            coords = self.places.get(', '.join(parts[i:]))
+            if coords is not None:
+                return coords
+        return None
+
+
+def _create_backend():
+    backend = getattr(settings, 'GEOCODER_BACKEND', 'nominatim')
+    if backend == 'nominatim':
+        return NominatimBackend(
+            user_agent=getattr(settings, 'GEOCODER_USER_AGENT', 'donation_ai'),
+            timeout=getattr(settings, 'GEOCODER_TIMEOUT', 5),
+        )
+    if backend == 'gazetteer':
+        return GazetteerBackend(getattr(settings, 'GEOCODER_GAZETTEER_PATH', ''))
+    # Anything else is a dotted path to a class with a ``geocode(query)`` method
+    return import_string(backend)()
+
+
+def cache_entries(keys):
+    """GeocodeCache rows for normalized address ``keys``."""
+    from ..models import GeocodeCache
+    return GeocodeCache.objects.filter(address_key__in=keys)
+
+class Geocoder:
+    """Address -> (latitude, longitude) with two cache tiers.
+
+    Lookups hit the in-process LRU first, then the ``GeocodeCache`` table,
+    and only then the backend. Addresses that do not resolve are cached too
+    (for ``negative_ttl`` seconds) so repeated bad input never reaches the
+    upstream service; transient backend failures are not cached.
+    """
+
+    def __init__(self, backend=None, cache_size=1024, negative_ttl=86400, max_concurrency=1):
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self.negative_ttl = negative_ttl
+        self.memory = LRUCache(cache_size)
+        self.max_concurrency = max_concurrency
+        self._loop_states = weakref.WeakKeyDictionary()  # event loop -> semaphore, in-flight lookups
+        self._lookup_pool = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = _create_backend()
+        return self._backend
+
+    @timed('geocode')
+    def geocode(self, address):
+        key = normalize_address(address)
+        if not key:
+            return None
+
+        coords = self.memory.get(key)
+        if coords is not _MISSING:
+            return coords
+
+        coords = self._from_database(key)
+        if coords is _MISSING:
+            try:
+                coords = self.backend.geocode(address)
+            except GeocodingUnavailable as e:
+                logger.error(f"Geocoding error: {e}")
+                return None
+            self._store(key, address, coords)
+
+        self.memory.set(key, coords, ttl=None if coords else self.negative_ttl)
+        return coords
+
+    async def ageocode(self, address):
+        """Async form of ``geocode`` for ASGI views.
+
+        Concurrent requests for the same address share one lookup, and at
+        most ``max_concurrency`` upstream lookups run at once per event
+        loop. The cache table is read and written through sync_to_async;
+        backends without a native ``ageocode`` run in the geocoder's own
+        thread pool, so the event loop never blocks on the network.
+        """
+        key = normalize_address(address)
+        if not key:
+            return None
+
+        coords = self.memory.get(key)
+        if coords is not _MISSING:
+            return coords
+
+        state = self._loop_state()
+        task = state.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._aresolve(key, address, state.semaphore))
+            state.inflight[key] = task
+            task.add_done_callback(lambda _: state.inflight.pop(key, None))
+        with timed('geocode'):
+            # Shielded: one caller going away must not cancel the others' lookup
+            return await asyncio.shield(task)
+
+    def _executor(self):
+        # Own pool so blocking lookups don't starve the loop's default executor
+        if self._lookup_pool is None:
+            with self._backend_lock:
+                if self._lookup_pool is None:
+                    self._lookup_pool = ThreadPoolExecutor(max_workers=max(1, self.max_concurrency),
+                                                           thread_name_prefix='geocoder')
+        return self._lookup_pool
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loop_states.get(loop)
+        if state is None:
+            state = SimpleNamespace(semaphore=asyncio.Semaphore(max(1, self.max_concurrency)), inflight={})
+            self._loop_states[loop] = state
+        return state
+
+    async def _aresolve(self, key, address, semaphore):
+        coords = await sync_to_async(self._from_database)(key)
+        if coords is _MISSING:
+            async with semaphore:
+                try:
+                    if hasattr(self.backend, 'ageocode'):
+                        coords = await self.backend.ageocode(address)
+                    else:
+                        coords = await asyncio.get_running_loop().run_in_executor(
+                            self._executor(), self.backend.geocode, address
+                        )
+                except GeocodingUnavailable as e:
+                    logger.error(f"Geocoding error: {e}")
+                    return None
+            await sync_to_async(self._store)(key, address, coords)
+
+        self.memory.set(key, coords, ttl=None if coords else self.negative_ttl)
+        return coords
+
+    @timed('geocode')
+    def geocode_many(self, addresses, max_workers=1):
+        """Resolve many addresses, looking each distinct one up once.
+
+        Both cache tiers are read in bulk; only the remaining misses go to
+        the backend, at most ``max_workers`` at a time. Returns a dict from
+        each input address to its coordinates or None.
+        """
+        queries = {}
+        for address in addresses:
+            key = normalize_address(address)
+            if key:
+                queries.setdefault(key, address)
+
+        results = {}
+        for key in queries:
+            coords = self.memory.get(key)
+            if coords is not _MISSING:
+                results[key] = coords
+
+        for key, coords in self._from_database_many([k for k in queries if k not in results]).items():
+            self.memory.set(key, coords, ttl=None if coords else self.negative_ttl)
+            results[key] = coords
+
+        misses = [key for key in queries if key not in results]
+        if misses:
+            def lookup(key):
+                try:
+                    return self.backend.geocode(queries[key])
+                except GeocodingUnavailable as e:
+                    logger.error(f"Geocoding error: {e}")
+                    return _MISSING
+
+            with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+                for key, coords in zip(misses, pool.map(lookup, misses)):
+                    if coords is _MISSING:
+                        results[key] = None  # Transient failure: not cached
+                        continue
+                    self._store(key, queries[key], coords)
+                    self.memory.set(key, coords, ttl=None if coords else self.negative_ttl)
+                    results[key] = coords
+
+        return {address: results.get(normalize_address(address)) for address in addresses}
+
+    def _entry_coords(self, entry):
+        if entry.latitude is None:
+            if entry.updated_at < timezone.now() - timedelta(seconds=self.negative_ttl):
+                return _MISSING
+            return None
+        return entry.latitude, entry.longitude
+
+    def _from_database(self, key):
+        try:
+            entry = cache_entries([key]).first()
+        except Exception as e:
+            logger.error(f"Geocode cache read error: {e}")
+            return _MISSING
+        if entry is None:
+            return _MISSING
+        return self._entry_coords(entry)
+
+    def _from_database_many(self, keys, chunk_size=500):
+        found = {}
+        try:
+            for i in range(0, len(keys), chunk_size):
+                for entry in cache_entries(keys[i:i + chunk_size]):
+                    coords = self._entry_coords(entry)
+                    if coords is not _MISSING:
+                        found[entry.address_key] = coords
+        except Exception as e:
+            logger.error(f"Geocode cache read error: {e}")
+        return found
+
+    def _store(self, key, address, coords):
+        from ..models import GeocodeCache
+        lat, lon = coords if coords else (None, None)
+        try:
+            GeocodeCache.objects.update_or_create(
+                address_key=key,
+                defaults={
+                    'query': address[:255],
+                    'latitude': lat,
+                    'longitude': lon,
+                    'backend': getattr(self.backend, 'name', type(self.backend).__name__)[:50],
+                },
+            )
+        except Exception as e:
+            logger.error(f"Geocode cache write error: {e}")
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder():
+    global _geocoder
+    if _geocoder is None:
+        with _geocoder_lock:
+            if _geocoder is None:
+                _geocoder = Geocoder(
+                    cache_size=getattr(settings, 'GEOCODER_CACHE_SIZE', 1024),
+                    negative_ttl=getattr(settings, 'GEOCODER_NEGATIVE_TTL', 86400),
+                    max_concurrency=getattr(settings, 'GEOCODER_CONCURRENCY', 1),
+                )
+    return _geocoder
+
+
+def set_geocoder(geocoder):
+    """Replace the shared geocoder (benchmarks swap in a stub backend)."""
+    global _geocoder
+    with _geocoder_lock:
+        _geocoder = geocoder
+
+
+def geocode(address):
+    """Resolve ``address`` to ``(latitude, longitude)`` or ``(None, None)``."""
+    coords = get_geocoder().geocode(address)
+    return coords if coords else (None, None)
+
+
+async def ageocode(address):
+    """Async form of ``geocode``."""
+    coords = await get_geocoder().ageocode(address)
+    return coords if coords else (None, None)
+
+
+def geocode_many(addresses, max_workers=None):
+    """Bulk form of ``geocode``: a dict from each address to ``(lat, lon)`` or None."""
+    if max_workers is None:
+        max_workers = getattr(settings, 'GEOCODER_CONCURRENCY', 1)
+    return get_geocoder().geocode_many(addresses, max_workers=max_workers)
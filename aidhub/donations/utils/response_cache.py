@@ -0,0 +1,75 @@
+import hashlib
+import logging
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+logger = logging.getLogger('aidhub')
+
+GENERATION_KEY = 'api:generation'
+
+def get_generation():
+    """Time of the last data change, as a float timestamp.
+
+    Every cached response is keyed on this value, so bumping it makes all
+    of them unreachable at once; it also goes into the ETag.
+    """
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # First use, or the entry was evicted: treat everything as changed
+        generation = time.time()
+        cache.add(GENERATION_KEY, generation, timeout=None)
+        generation = cache.get(GENERATION_KEY, generation)
+    return generation
+
+def invalidate_api_cache():
+    cache.set(GENERATION_KEY, time.time(), timeout=None)
+
+def cached_api_response(name):
+    """Cache a GET view's response and answer conditional requests.
+
+    Responses are stored per endpoint ``name`` and query string under the
+    current generation. The ETag is derived from the generation, so a
+    matching If-None-Match gets a 304 without touching the database. There
+    is no Last-Modified: it has one-second resolution, and two changes
+    within a second would share it. Streaming responses, non-200 responses
+    and responses marked no-store (see ``add_never_cache_headers``) are
+    passed through uncached.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+
+            generation = get_generation()
+            query = hashlib.sha1(
+                '&'.join(sorted(request.GET.urlencode().split('&'))).encode()
+            ).hexdigest()[:16]
+            etag = f'"{name}-{generation:.6f}-{query}"'
+
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                key = f"api:{name}:{generation:.6f}:{query}"
+                cached = cache.get(key)
+                if cached is not None:
+                    content, content_type = cached
+                    response = HttpResponse(content, content_type=content_type)
+                else:
+                    response = view_func(request, *args, **kwargs)
+                    if (response.streaming or response.status_code != 200
+                            or 'no-store' in response.get('Cache-Control', '')):
+                        return response
+                    cache.set(key, (response.content, response['Content-Type']),
+                              timeout=settings.API_CACHE_TIMEOUT)
+
+            response['ETag'] = etag
+            # Let browsers keep the body but revalidate on every load
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+    return decorator
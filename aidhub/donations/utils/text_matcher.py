@@ -1,23 +1,117 @@
 import re
+from collections import Counter
+from functools import lru_cache
 
+# Word stems per category. A stem matches at the start of a word and
+# absorbs any suffix, so 'shoe' also matches 'shoes' and 'medic' matches
+# 'medicine', but 'pen' no longer matches inside 'open'.
+DONATION_KEYWORDS = {
+    'clothes': ['cloth', 'shirt', 'pant', 'dress', 'jacket', 'shoe'],
+    'food': ['food', 'meal', 'grocer', 'fruit', 'vegetable'],
+    'medicine': ['medic', 'drug', 'pill', 'prescription'],
+    'electronics': ['electronic', 'phone', 'laptop', 'computer', 'device'],
+    'books': ['book', 'textbook', 'novel', 'magazine'],
+    'toys': ['toy', 'game', 'puzzle', 'doll'],
+    'furniture': ['furniture', 'chair', 'table', 'desk', 'bed'],
+    'hygiene': ['hygiene', 'soap', 'sanitizer', 'toothpaste'],
+    'school_supplies': ['school', 'pen', 'pencil', 'notebook', 'backpack'],
+}
+
+# Per-category patterns, kept for callers that used the old table
 DONATION_PATTERNS = {
-    'clothes': r'(cloth|shirt|pant|dress|jacket|shoe)',
-    'food': r'(food|meal|grocery|fruit|vegetable)',
-    'medicine': r'(medic|drug|pill|prescription)',
-    'electronics': r'(electronic|phone|laptop|computer|device)',
-    'books': r'(book|textbook|novel|magazine)',
-    'toys': r'(toy|game|puzzle|doll)',
-    'furniture': r'(furniture|chair|table|desk|bed)',
-    'hygiene': r'(hygiene|soap|sanitizer|toothpaste)',
-    'school_supplies': r'(school|pen|pencil|notebook|backpack)',
+    category: '(' + '|'.join(stems) + ')' for category, stems in DONATION_KEYWORDS.items()
 }
 
+STEM_CATEGORIES = {stem: category for category, stems in DONATION_KEYWORDS.items() for stem in stems}
+_STEM_LENGTHS = sorted({len(stem) for stem in STEM_CATEGORIES}, reverse=True)
+
+def _trie_regex(words):
+    """Regex source for ``words`` factored into a prefix trie.
+
+    ``re`` tries alternatives one by one, so sharing prefixes lets each
+    position be rejected after a single character test instead of one per
+    keyword.
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = {}  # End of a word
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            body = body + '?' if len(branches) == 1 and len(body) == 1 else f'(?:{body})?'
+        return body
+
+    return build(trie)
+
+# Built once at import; finds every keyword in a single left-to-right scan
+_KEYWORD_SOURCE = r'\b' + _trie_regex(STEM_CATEGORIES) + r'\w*'
+DONATION_REGEX = re.compile(_KEYWORD_SOURCE)
+_DONATION_REGEX_IGNORECASE = re.compile(_KEYWORD_SOURCE, re.IGNORECASE)
+
+def _find_keywords(text):
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return DONATION_REGEX.finditer(lowered)
+    # Lowercasing changed some lengths (rare Unicode), so offsets would drift
+    return _DONATION_REGEX_IGNORECASE.finditer(text)
+
+def _stem_category(word):
+    word = word.lower()
+    for length in _STEM_LENGTHS:
+        category = STEM_CATEGORIES.get(word[:length])
+        if category:
+            return category
+    return None
+
+def scan_donation_text(text):
+    """Every keyword hit in ``text``.
+
+    Returns a dict with ``categories`` (in DONATION_KEYWORDS order),
+    per-category hit ``counts`` and the individual ``matches`` with their
+    offsets into the original text.
+    """
+    text = text or ''
+    matches = [
+        {
+            'category': _stem_category(m.group(0)),
+            'term': text[m.start():m.end()],
+            'start': m.start(),
+            'end': m.end(),
+        }
+        for m in _find_keywords(text)
+    ]
+    counts = Counter(m['category'] for m in matches)
+    return {
+        'categories': [c for c in DONATION_KEYWORDS if c in counts],
+        'counts': dict(counts),
+        'matches': matches,
+    }
+
+def normalize_text(text):
+    """Lowercase and collapse whitespace; matching is insensitive to both."""
+    return ' '.join((text or '').lower().split())
+
+@lru_cache(maxsize=4096)
+def _match_normalized(text):
+    found = set()
+    for m in _find_keywords(text):
+        found.add(_stem_category(m.group(0)))
+        if len(found) == len(DONATION_KEYWORDS):
+            break
+    return tuple(category for category in DONATION_KEYWORDS if category in found)
+
 def match_donation_text(text):
-    text = text.lower()
-    matches = []
-    
-    for category, pattern in DONATION_PATTERNS.items():
-        if re.search(pattern, text):
-            matches.append(category)
-    
-    return matches
\ No newline at end of file
+    # Keystroke-driven callers resend the same text often (typing, then
+    # deleting), so results for recent normalized texts are cached
+    return list(_match_normalized(normalize_text(text)))
+
+def match_donation_texts(texts):
+    """Bulk form of match_donation_text: one category list per text."""
+    return [match_donation_text(text) for text in texts]
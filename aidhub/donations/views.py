@@ -1,18 +1,36 @@
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views import View
-from django.db.models import Count, Avg
+from django.db.models import Q
 from django.core.exceptions import ObjectDoesNotExist
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import add_never_cache_headers
+from django.utils.decorators import method_decorator
 from .models import Recipient, Donation, DonatedRecipient
-from .ml.predictor import predict_urgency, get_coordinates
-from .ml.trainer import train_model, train_trend_model
-from geopy.distance import geodesic
+from .ml.predictor import predict_urgency_batch, aget_coordinates
+from .ml.scheduler import schedule_retrain
+from .importer import IMPORT_FORMATS, guess_format, iter_import
+from .instrumentation import render_metrics
+from .profiling import profiled
+from .stats import get_summary, get_type_stats, record_change, tracked_values
+from .utils.geo import geohash_prefixes, rank_nearby
+from .utils.response_cache import cached_api_response, invalidate_api_cache
+import numpy as np
+import base64
+import binascii
+import codecs
+import csv
+import hmac
 import json
 import logging
-from .ml.image_classifier import classifier  # Add this import
-from .utils.text_matcher import match_donation_text  # Add this import
+from datetime import datetime
+from .ml.image_classifier import rank_image
+from .utils.text_matcher import match_donation_text, match_donation_texts
 from django.views.decorators.csrf import csrf_exempt  # Add this import
-from django.db import transaction  # Add this import
+from django.db import IntegrityError, transaction
+from django.utils import timezone
 
 logger = logging.getLogger('aidhub')
 
@@ -20,12 +38,11 @@ class IndexView(View):
     def get(self, request):
         return render(request, 'donations/index.html')
 
+@method_decorator(cached_api_response('trending'), name='get')
 class TrendingView(View):
     def get(self, request):
         try:
-            trends = Recipient.objects.values('donation_type') \
-                                   .annotate(count=Count('id')) \
-                                   .order_by('-count')[:3]
+            trends = get_type_stats('recipient', limit=3)
             
             trend_list = []
             for trend in trends:
@@ -41,13 +58,30 @@ class TrendingView(View):
             })
         except Exception as e:
             logger.error(f"Error getting trends: {e}")
-            return JsonResponse({
+            response = JsonResponse({
                 "message": "Error getting trends",
                 "trends": []
             })
+            add_never_cache_headers(response)  # Keep the fallback out of the cache
+            return response
+
+def recipient_candidates(donation_type, prefixes=()):
+    """(id, latitude, longitude, urgency) of open recipients of a type,
+    limited to the geohash cells in ``prefixes`` when given."""
+    candidates = Recipient.objects.filter(status='open', donation_type=donation_type)
+    if prefixes:
+        nearby = Q()
+        for prefix in prefixes:
+            # A range rather than LIKE, so the index on geohash applies
+            nearby |= Q(geohash__gte=prefix, geohash__lt=prefix + '~')
+        candidates = candidates.filter(nearby)
+    return candidates.values_list('id', 'latitude', 'longitude', 'urgency')
 
+@method_decorator(profiled('recipients'), name='get')
 class RecipientListView(View):
-    def get(self, request):
+    # Async so a slow geocode only parks this request; under WSGI Django
+    # runs it in an event loop per request
+    async def get(self, request):
         donation_type = request.GET.get('type', '').lower()
         donor_location = request.GET.get('location', '')
         
@@ -55,23 +89,40 @@ class RecipientListView(View):
             return JsonResponse({"error": "Missing donation type or location"}, status=400)
         
         try:
-            donor_lat, donor_lon = get_coordinates(donor_location)
+            radius = float(request.GET['radius']) if request.GET.get('radius') else None
+            limit = int(request.GET['limit']) if request.GET.get('limit') else None
+        except ValueError:
+            return JsonResponse({"error": "Invalid radius or limit"}, status=400)
+        if (radius is not None and radius <= 0) or (limit is not None and limit <= 0):
+            return JsonResponse({"error": "Invalid radius or limit"}, status=400)
+        
+        try:
+            donor_lat, donor_lon = await aget_coordinates(donor_location)
             if donor_lat is None:
                 return JsonResponse({"error": "Invalid location"}, status=400)
             
-            recipients = Recipient.objects.filter(donation_type=donation_type)
-            if not recipients:
+            # Only touch rows in the geohash cells around the donor
+            prefixes = geohash_prefixes(donor_lat, donor_lon, radius) if radius is not None else ()
+            rows = [row async for row in recipient_candidates(donation_type, prefixes)]
+            if not rows:
                 return JsonResponse({"error": "No matching recipients found"}, status=404)
             
+            # Vectorized distance filter and ranking by distance and urgency
+            ids, lats, lons, urgencies = np.array(rows, dtype=np.float64).T
+            indices, distances = rank_nearby(donor_lat, donor_lon, lats, lons, urgencies,
+                                             radius_km=radius, limit=limit)
+            if not len(indices):
+                return JsonResponse({"error": "No matching recipients found"}, status=404)
+            
+            selected = [int(i) for i in ids[indices]]
+            by_id = await Recipient.objects.ain_bulk(selected)
+            recipients = [by_id[i] for i in selected]
+            
+            # Score the selected rows in one pass (constant number of queries)
+            scores = await sync_to_async(predict_urgency_batch)(recipients)
+            
             recipient_list = []
-            for recipient in recipients:
-                confidence = predict_urgency(recipient.location, recipient.donation_type)[1]
-                # Calculate distance
-                distance = geodesic(
-                    (donor_lat, donor_lon),
-                    (recipient.latitude, recipient.longitude)
-                ).km
-                
+            for recipient, distance, (_, confidence) in zip(recipients, distances, scores):
                 recipient_list.append({
                     'id': recipient.id,
                     'name': recipient.name,
@@ -82,12 +133,9 @@ class RecipientListView(View):
                     'urgency': recipient.urgency,
                     'contact': recipient.contact,
                     'confidence': confidence,
-                    'distance': distance  # Add distance to response
+                    'distance': float(distance)
                 })
             
-            # Sort by distance and urgency
-            recipient_list.sort(key=lambda x: (x['distance'] * 0.3) - (x['urgency'] * 0.7))
-            
             return JsonResponse({
                 "recipients": recipient_list,
                 "donor_coordinates": {
@@ -100,7 +148,41 @@ class RecipientListView(View):
             logger.error(f"Error listing recipients: {e}")
             return JsonResponse({"error": str(e)}, status=500)
 
+def _donation_response(donation, recipient_name, replayed=False):
+    return JsonResponse({
+        "success": True,
+        "message": "Donation successful",
+        "replayed": replayed,
+        "details": {
+            "donor": donation.donor_name,
+            "recipient": recipient_name,
+            "type": donation.donation_type
+        }
+    })
+
+def donation_by_key(idempotency_key):
+    return Donation.objects.select_related('recipient').filter(idempotency_key=idempotency_key)
+
+def _replay_donation(idempotency_key):
+    """Response of an earlier request with the same key, or None."""
+    if not idempotency_key:
+        return None
+    donation = donation_by_key(idempotency_key).first()
+    if donation is None:
+        return None
+    return _donation_response(donation, donation.recipient.name, replayed=True)
+
+@method_decorator(profiled('donate'), name='post')
 class DonationView(View):
+    """Claim an open recipient for a donor.
+
+    The claim is a conditional ``open -> claimed`` update, so of any number
+    of concurrent donors exactly one wins and the rest get a 409. Claimed
+    recipients are kept (with their Donation) rather than deleted. Retried
+    POSTs carrying the same ``Idempotency-Key`` header (or
+    ``idempotency_key`` field) get the original response back instead of a
+    second donation.
+    """
     def post(self, request):
         try:
             data = json.loads(request.body)
@@ -114,13 +196,32 @@ class DonationView(View):
                         "error": f"Missing required field: {field}"
                     }, status=400)
 
+            idempotency_key = (request.headers.get('Idempotency-Key') or data.get('idempotency_key') or '')[:64] or None
+            replay = _replay_donation(idempotency_key)
+            if replay is not None:
+                return replay
+
             try:
                 with transaction.atomic():
-                    # Get recipient first
+                    # Claim the recipient; only one request can flip it from open
+                    claimed = Recipient.objects.filter(id=data['recipient_id'], status='open') \
+                                               .update(status='claimed', claimed_at=timezone.now())
+                    if not claimed:
+                        if Recipient.objects.filter(id=data['recipient_id']).exists():
+                            return _replay_donation(idempotency_key) or JsonResponse({
+                                "success": False,
+                                "error": "Recipient has already received a donation"
+                            }, status=409)
+                        raise ObjectDoesNotExist
+
                     recipient = Recipient.objects.get(id=data['recipient_id'])
+                    # .update() skips signals: move the aggregates and drop
+                    # cached responses by hand
+                    record_change(Recipient, {**tracked_values(recipient), 'status': 'open'}, tracked_values(recipient))
+                    transaction.on_commit(invalidate_api_cache)
                     
                     # Create DonatedRecipient record
-                    donated = DonatedRecipient.objects.create(
+                    DonatedRecipient.objects.create(
                         name=recipient.name,
                         location=recipient.location,
                         latitude=recipient.latitude,
@@ -130,7 +231,8 @@ class DonationView(View):
                         donor_name=data['donor_name'],
                         recipient_contact=recipient.contact,
                         donor_contact=data['donor_contact'],
-                        pickup_location=data['pickup_location']
+                        pickup_location=data['pickup_location'],
+                        recipient=recipient,
                     )
                     
                     # Create Donation record with new fields
@@ -141,27 +243,24 @@ class DonationView(View):
                         pickup_location=data['pickup_location'],
                         recipient=recipient,
                         suggested_type=data.get('suggested_type', ''),
-                        text_pattern_match=data.get('text_pattern_match', '')
+                        text_pattern_match=data.get('text_pattern_match', ''),
+                        idempotency_key=idempotency_key
                     )
-                    
-                    # Delete recipient only after successful creation
-                    recipient.delete()
 
-                    return JsonResponse({
-                        "success": True,
-                        "message": "Donation successful",
-                        "details": {
-                            "donor": data['donor_name'],
-                            "recipient": recipient.name,
-                            "type": data['donation_type']
-                        }
-                    })
+                return _donation_response(donation, recipient.name)
                     
             except ObjectDoesNotExist:
                 return JsonResponse({
                     "success": False,
                     "error": "Recipient not found"
                 }, status=404)
+
+            except IntegrityError:
+                # A concurrent retry with the same key committed first
+                replay = _replay_donation(idempotency_key)
+                if replay is not None:
+                    return replay
+                raise
                 
             except Exception as e:
                 logger.error(f"Database transaction error: {str(e)}")
@@ -182,8 +281,9 @@ class DonationView(View):
                 "error": "An unexpected error occurred while processing your donation"
             }, status=500)
 
+@method_decorator(profiled('add_recipient'), name='post')
 class AddRecipientView(View):
-    def post(self, request):
+    async def post(self, request):
         try:
             data = json.loads(request.body)
             required = ['name', 'location', 'donation_type', 'contact']
@@ -191,25 +291,24 @@ class AddRecipientView(View):
             if not all(field in data for field in required):
                 return JsonResponse({"error": "Missing required fields"}, status=400)
             
-            latitude, longitude = get_coordinates(data['location'])
+            latitude, longitude = await aget_coordinates(data['location'])
             if latitude is None:
                 return JsonResponse({"error": "Invalid location"}, status=400)
             
-            urgency, confidence = predict_urgency(data['location'], data['donation_type'])
-            
-            recipient = Recipient.objects.create(
+            recipient = Recipient(
                 name=data['name'],
                 location=data['location'],
                 latitude=latitude,
                 longitude=longitude,
                 donation_type=data['donation_type'].lower(),
-                urgency=urgency,
                 contact=data['contact']
             )
+            urgency, confidence = (await sync_to_async(predict_urgency_batch)([recipient]))[0]
+            recipient.urgency = urgency
+            await recipient.asave()
             
-            # Retrain models
-            train_model()
-            train_trend_model()
+            # Retrain models in the background (bursts coalesce into one fit)
+            await sync_to_async(schedule_retrain)()
             
             return JsonResponse({
                 "success": True,
@@ -222,29 +321,132 @@ class AddRecipientView(View):
             logger.error(f"Error adding recipient: {e}")
             return JsonResponse({"error": str(e)}, status=500)
 
+class ImportRecipientsView(View):
+    """Bulk recipient import for staff; the API form of ``import_recipients``.
+
+    The body is read as a stream: CSV (``text/csv``), NDJSON
+    (``application/x-ndjson``) or a JSON array, or a multipart upload in
+    ``file``. ``?format=`` overrides the detected format. The response is
+    NDJSON: a ``progress`` line per batch, then ``done`` with the summary.
+    """
+    CONTENT_FORMATS = {
+        'text/csv': 'csv',
+        'application/x-ndjson': 'ndjson',
+        'application/json': 'json',
+    }
+
+    def post(self, request):
+        if not request.user.is_staff:
+            return JsonResponse({"error": "Staff login required"}, status=403)
+
+        if request.content_type == 'multipart/form-data':
+            upload = request.FILES.get('file')
+            if upload is None:
+                return JsonResponse({"error": "No file provided"}, status=400)
+            source, detected = upload, guess_format(upload.name)
+        else:
+            source, detected = request, self.CONTENT_FORMATS.get(request.content_type, 'csv')
+        fmt = request.GET.get('format', detected)
+        if fmt not in IMPORT_FORMATS:
+            return JsonResponse({"error": f"Unknown format: {fmt}"}, status=400)
+        stream = codecs.getreader('utf-8-sig')(source)
+
+        def events():
+            # Each summary is sent once the next one shows it wasn't the last
+            previous = None
+            try:
+                for summary in iter_import(stream, fmt):
+                    if previous is not None:
+                        yield json.dumps({"event": "progress", **previous}) + '\n'
+                    previous = summary
+            except Exception as e:
+                logger.error(f"Error importing recipients: {e}")
+                yield json.dumps({"event": "error", "error": str(e)}) + '\n'
+                return
+            yield json.dumps({"event": "done", **previous}) + '\n'
+
+        return StreamingHttpResponse(events(), content_type='application/x-ndjson')
+
+HISTORY_FIELDS = [
+    'id', 'name', 'location', 'donation_type', 'donor_name',
+    'recipient_contact', 'donor_contact', 'pickup_location', 'transaction_date'
+]
+
+def _history_item(t):
+    return {
+        "recipient_name": t['name'],
+        "location": t['location'],
+        "donation_type": t['donation_type'],
+        "donor_name": t['donor_name'],
+        "recipient_contact": t['recipient_contact'],
+        "donor_contact": t['donor_contact'],
+        "pickup_location": t['pickup_location'],
+        "date": t['transaction_date']
+    }
+
+def history_rows(after=None):
+    """History rows newest first, starting after the (transaction_date, id) ``after``."""
+    transactions = DonatedRecipient.objects.order_by('-transaction_date', '-id')
+    if after is not None:
+        after_date, after_id = after
+        # The redundant upper bound lets the index seek to the cursor
+        transactions = transactions.filter(transaction_date__lte=after_date).filter(
+            Q(transaction_date__lt=after_date) |
+            Q(transaction_date=after_date, id__lt=after_id)
+        )
+    return transactions.values(*HISTORY_FIELDS)
+
+def encode_history_cursor(transaction_date, pk):
+    raw = f"{transaction_date.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+    date_part, pk = raw.rsplit('|', 1)
+    return datetime.fromisoformat(date_part), int(pk)
+
+class _Echo:
+    """File-like object whose write() returns the value, for streaming csv."""
+
+    def write(self, value):
+        return value
+
+@method_decorator(cached_api_response('history'), name='get')
 class HistoryView(View):
+    """Donation history, newest first.
+
+    JSON responses are keyset-paginated on (transaction_date, id): pass
+    ``limit`` (default 50, max 500) and the previous page's ``next_cursor``
+    as ``cursor``. ``format=ndjson`` or ``format=csv`` streams the full
+    history instead.
+    """
+    DEFAULT_LIMIT = 50
+    MAX_LIMIT = 500
+    EXPORT_CHUNK_SIZE = 2000
+
     def get(self, request):
+        export_format = request.GET.get('format', 'json')
+        if export_format in ('ndjson', 'csv'):
+            return self.export(export_format)
+
         try:
-            transactions = DonatedRecipient.objects.all().order_by('-transaction_date')
-            type_stats = DonatedRecipient.objects.values('donation_type') \
-                                                .annotate(
-                                                    count=Count('id'),
-                                                    avg_urgency=Avg('urgency')
-                                                ) \
-                                                .order_by('-count')
+            limit = min(int(request.GET.get('limit', self.DEFAULT_LIMIT)), self.MAX_LIMIT)
+            if limit <= 0:
+                raise ValueError
+            cursor = request.GET.get('cursor')
+            after = decode_history_cursor(cursor) if cursor else None
+        except (ValueError, TypeError, UnicodeDecodeError, binascii.Error):
+            return JsonResponse({"error": "Invalid limit or cursor"}, status=400)
+
+        try:
+            # One extra row tells us whether another page exists
+            page = list(history_rows(after)[:limit + 1])
+            has_more = len(page) > limit
+            page = page[:limit]
+
+            type_stats = get_type_stats('donated')
             
-            transaction_list = []
-            for t in transactions:
-                transaction_list.append({
-                    "recipient_name": t.name,
-                    "location": t.location,
-                    "donation_type": t.donation_type,
-                    "donor_name": t.donor_name,
-                    "recipient_contact": t.recipient_contact,
-                    "donor_contact": t.donor_contact,
-                    "pickup_location": t.pickup_location,
-                    "date": t.transaction_date
-                })
+            transaction_list = [_history_item(t) for t in page]
             
             stats_list = []
             for stat in type_stats:
@@ -254,39 +456,61 @@ class HistoryView(View):
                     "avg_urgency": float(stat['avg_urgency'])
                 })
             
+            next_cursor = None
+            if has_more:
+                last = page[-1]
+                next_cursor = encode_history_cursor(last['transaction_date'], last['id'])
+            
             return JsonResponse({
                 "transactions": transaction_list,
-                "type_stats": stats_list
+                "type_stats": stats_list,
+                "next_cursor": next_cursor
             })
             
         except Exception as e:
             logger.error(f"Error getting donation history: {e}")
-            return JsonResponse({
+            response = JsonResponse({
                 "transactions": [],
                 "type_stats": [],
+                "next_cursor": None,
                 "error": str(e)
             })
+            add_never_cache_headers(response)  # Keep the fallback out of the cache
+            return response
+
+    def export(self, export_format):
+        rows = history_rows().iterator(chunk_size=self.EXPORT_CHUNK_SIZE)
+
+        if export_format == 'ndjson':
+            encoder = DjangoJSONEncoder()
+            stream = (encoder.encode(_history_item(t)) + '\n' for t in rows)
+            response = StreamingHttpResponse(stream, content_type='application/x-ndjson')
+            response['Content-Disposition'] = 'attachment; filename="donation_history.ndjson"'
+            return response
 
+        columns = list(_history_item(dict.fromkeys(HISTORY_FIELDS)))
+        writer = csv.writer(_Echo())
+
+        def stream():
+            yield writer.writerow(columns)
+            for t in rows:
+                item = _history_item(t)
+                item['date'] = item['date'].isoformat()
+                yield writer.writerow(item.values())
+
+        response = StreamingHttpResponse(stream(), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="donation_history.csv"'
+        return response
+
+@method_decorator(cached_api_response('summary_stats'), name='get')
 class SummaryStatsView(View):
     def get(self, request):
         try:
-            # Get total donations by combining current donations and donated history
-            total_donations = (
-                Donation.objects.count() + 
-                DonatedRecipient.objects.count()
-            )
-            
-            # Get unique donors by combining both tables and using distinct
-            unique_donors = len(set(
-                list(Donation.objects.values_list('donor_name', flat=True)) +
-                list(DonatedRecipient.objects.values_list('donor_name', flat=True))
-            ))
-            
-            # Get unique communities served
-            communities_served = len(set(
-                list(Recipient.objects.values_list('location', flat=True)) +
-                list(DonatedRecipient.objects.values_list('location', flat=True))
-            ))
+            # Maintained incrementally by donations.stats, so this is O(1)
+            summary = get_summary()
+            total_donations = summary['total_donations']
+            unique_donors = summary['unique_donors']
+            communities_served = summary['communities_served']
             
             return JsonResponse({
                 'total_donations': total_donations,
@@ -296,12 +520,26 @@ class SummaryStatsView(View):
             
         except Exception as e:
             logger.error(f"Error getting summary stats: {e}")
-            return JsonResponse({
+            response = JsonResponse({
                 'total_donations': 0,
                 'unique_donors': 0,
                 'communities_served': 0
             })
+            add_never_cache_headers(response)  # Keep the fallback out of the cache
+            return response
+
+class MetricsView(View):
+    def get(self, request):
+        # Prometheus scrape endpoint; METRICS_TOKEN, when set, is a bearer token
+        if settings.METRICS_TOKEN:
+            expected = f"Bearer {settings.METRICS_TOKEN}"
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+                return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+        response = HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+        add_never_cache_headers(response)
+        return response
 
+@method_decorator(profiled('classify_image'), name='post')
 class ClassifyImageView(View):  # Add this new view class
     def post(self, request):
         try:
@@ -312,12 +550,16 @@ class ClassifyImageView(View):  # Add this new view class
                 }, status=400)
 
             image_file = request.FILES['image']
-            category, confidence = classifier.classify_image(image_file)
+            ranked = rank_image(image_file)
+            category, confidence = ranked[0]
 
             return JsonResponse({
                 'success': True,
                 'category': category,
-                'confidence': confidence
+                'confidence': confidence,
+                'top_categories': [
+                    {'category': c, 'confidence': p} for c, p in ranked
+                ]
             })
         except Exception as e:
             logger.error(f"Error classifying image: {e}")
@@ -327,7 +569,7 @@ class ClassifyImageView(View):  # Add this new view class
             }, status=500)
 
 @csrf_exempt
-def detect_donation_type(request):  # Add this new function
+async def detect_donation_type(request):  # Add this new function
     if request.method == 'POST':
         data = json.loads(request.body)
         text = data.get('text', '')
@@ -337,3 +579,43 @@ def detect_donation_type(request):  # Add this new function
             'matches': matches
         })
     return JsonResponse({'success': False})
+
+@csrf_exempt
+def detect_donation_type_batch(request):
+    """Match many texts in one request.
+
+    A JSON body ``{"texts": [...]}`` gets ``{"results": [{"matches": [...]}]}``.
+    An NDJSON body (``Content-Type: application/x-ndjson``, one JSON string
+    or ``{"text": ...}`` object per line) is read incrementally and answered
+    with a streamed NDJSON line per input line.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'success': False}, status=405)
+
+    if request.content_type == 'application/x-ndjson':
+        def stream():
+            for index, line in enumerate(request):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    text = item.get('text', '') if isinstance(item, dict) else str(item)
+                    result = {'index': index, 'matches': match_donation_text(text)}
+                except json.JSONDecodeError:
+                    result = {'index': index, 'error': 'Invalid JSON line'}
+                yield json.dumps(result) + '\n'
+
+        return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+
+    try:
+        data = json.loads(request.body)
+        texts = data.get('texts', [])
+        if not isinstance(texts, list):
+            raise ValueError
+    except (json.JSONDecodeError, ValueError, AttributeError):
+        return JsonResponse({'success': False, 'error': 'Expected {"texts": [...]}'}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'results': [{'matches': matches} for matches in match_donation_texts(t if isinstance(t, str) else '' for t in texts)]
+    })
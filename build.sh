@@ -16,3 +16,6 @@ python manage.py collectstatic --no-input
 
 # Run database migrations
 python manage.py migrate
+
+# Fetch the image classifier weights so workers can memory-map them
+python manage.py download_image_model || echo "Image model weights will be downloaded on first use"
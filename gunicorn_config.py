@@ -2,13 +2,18 @@ import multiprocessing
 import os
 
 bind = "0.0.0.0:" + os.environ.get("PORT", "8000")
-workers = 1  # Reduced to minimum for memory conservation
-worker_class = "sync"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))  # Image model loads lazily, so workers are cheap
+# To size workers and memory, replay the site traffic with
+# `manage.py loadtest_traffic --url ... --server-pid <gunicorn master pid>`
+# Set GUNICORN_WORKER_CLASS=uvicorn_worker.UvicornWorker and serve
+# aidhub.asgi:application to run the async views on an event loop, so one
+# worker keeps serving while requests wait on geocoding
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
 threads = 1  # Reduce to 1 thread to minimize memory usage
-timeout = 600  # Increase timeout further for ML processing
+timeout = 120  # Model retraining runs in the background, not in requests
 max_requests = 50  # Reduce max requests to prevent memory leaks
 max_requests_jitter = 5
-preload_app = False  # Disable preloading to reduce memory usage
+preload_app = True  # Share the imported app between workers (torch is not imported at boot)
 worker_tmp_dir = "/dev/shm"  # Use RAM-based temporary directory
 keepalive = 60
 graceful_timeout = 300